@@ -0,0 +1,32 @@
+from typing import FrozenSet, Iterable, Optional
+
+from ninja import Field, Schema
+from ninja.errors import HttpError
+
+
+class FieldsetQuery(Schema):
+    """`?fields=` / `?expand=` query params selecting a sparse representation.
+
+    `fields` lists the fields to return (relations included), `expand` adds
+    relations to them. With `expand` alone every plain field is returned, plus the
+    listed relations. Without either the full representation is returned.
+    """
+
+    fields: Optional[str] = Field(None, description="Comma separated fields to return")
+    expand: Optional[str] = Field(None, description="Comma separated relations to include")
+
+    def resolve(self, available: Iterable[str], relations: Iterable[str]) -> Optional[FrozenSet[str]]:
+        """The selected field names, or `None` when the full representation is requested."""
+        if self.fields is None and self.expand is None:
+            return None
+        available, relations = list(available), set(relations)
+
+        selected = set(_split(self.fields)) if self.fields is not None else {name for name in available if name not in relations}
+        expanded = set(_split(self.expand))
+        if unknown := (selected - set(available)) | (expanded - relations):
+            raise HttpError(400, f"Unknown fields: {', '.join(sorted(unknown))}")
+        return frozenset(selected | expanded)
+
+
+def _split(raw: Optional[str]) -> list:
+    return [name.strip() for name in (raw or "").split(",") if name.strip()]
@@ -0,0 +1,150 @@
+import json
+import binascii
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, Optional
+from uuid import UUID
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q, QuerySet
+from ninja import Field, Schema
+from ninja.conf import settings as ninja_settings
+from ninja.errors import HttpError
+from ninja.pagination import LimitOffsetPagination
+
+
+class KeysetPagination(LimitOffsetPagination):
+    """Limit/offset pagination with an opt-in keyset (cursor) mode.
+
+    Without a `cursor` query param it behaves exactly like ninja's
+    `LimitOffsetPagination` (`items` + `count`). Sending `cursor=` (empty for the
+    first page, then the returned `next_cursor`) switches to keyset pagination:
+    rows are located with a `WHERE (sort keys) < (last seen keys)` condition
+    instead of `OFFSET`, and no `COUNT(*)` is issued, so every page costs the same.
+
+    The keys are the queryset ordering (or the model `Meta.ordering`) with the
+    primary key appended as a tiebreaker, so the ordering must only contain plain
+    field names, and `.values()` querysets must select all of them.
+    """
+
+    class Input(LimitOffsetPagination.Input):
+        cursor: Optional[str] = Field(None, description="Opaque cursor; send it empty to start keyset pagination")
+
+    class CursorInput(Schema):
+        """Params of listings that are only paginated on request: without a `cursor` every row is returned."""
+        limit: int = Field(ninja_settings.PAGINATION_PER_PAGE, ge=1)
+        cursor: Optional[str] = Field(None, description="Opaque cursor; send it empty to get the first page")
+
+    class Output(Schema):
+        items: List[Any]
+        count: Optional[int] = None
+        next_cursor: Optional[str] = None
+
+    def paginate_queryset(self, queryset: QuerySet, pagination: Input, request, **params) -> Any:
+        if pagination.cursor is None:
+            return super().paginate_queryset(queryset, pagination, request, **params)
+
+        queryset, ordering, limit = self._keyset_queryset(queryset, pagination)
+        items = list(queryset[:limit + 1])
+        return self._keyset_page(items, ordering, limit)
+
+    async def apaginate_queryset(self, queryset: QuerySet, pagination: Input, request, **params) -> Any:
+        if pagination.cursor is None:
+            return await super().apaginate_queryset(queryset, pagination, request, **params)
+
+        queryset, ordering, limit = self._keyset_queryset(queryset, pagination)
+        items = [obj async for obj in queryset[:limit + 1]]
+        return self._keyset_page(items, ordering, limit)
+
+    def _keyset_queryset(self, queryset: QuerySet, pagination: Input):
+        ordering = self.get_ordering(queryset)
+        limit = min(pagination.limit, self.max_limit)
+        queryset = queryset.order_by(*ordering)
+        if pagination.cursor:
+            values = self.decode_cursor(pagination.cursor, len(ordering))
+            try:
+                # the lookups convert each value to its field type, so a tampered cursor fails here
+                queryset = queryset.filter(self.after_position(ordering, values))
+            except (ValidationError, TypeError, ValueError):
+                raise HttpError(400, "Invalid cursor")
+        return queryset, ordering, limit
+
+    def _keyset_page(self, items: list, ordering: List[str], limit: int) -> dict:
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = self.encode_cursor([self._get_value(items[-1], field) for field in ordering])
+        return {
+            self.items_attribute: items,
+            "count": None,
+            "next_cursor": next_cursor,
+        }
+
+    @staticmethod
+    def get_ordering(queryset: QuerySet) -> List[str]:
+        ordering = list(queryset.query.order_by)
+        if not ordering and queryset.query.default_ordering:
+            ordering = list(queryset.model._meta.ordering)
+        if not all(isinstance(field, str) and field != "?" for field in ordering):
+            raise ValueError("KeysetPagination only supports ordering by field names")
+
+        pk_name = queryset.model._meta.pk.name
+        names = {field.lstrip("-") for field in ordering}
+        if not names & {"pk", pk_name}:
+            descending = bool(ordering) and ordering[0].startswith("-")
+            ordering.append(f"-{pk_name}" if descending else pk_name)
+        return ordering
+
+    @staticmethod
+    def after_position(ordering: List[str], values: list) -> Q:
+        """Row comparison `(f1, f2, ...) > (v1, v2, ...)` honoring each field direction.
+
+        Postgres row comparisons require every column to be sorted the same way, so
+        it's expanded to `f1 > v1 OR (f1 = v1 AND f2 > v2) OR ...`, and the leading
+        `f1 >= v1` bound is repeated so the planner can use it as an index range.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+
+        first = ordering[0]
+        bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": values[0]})
+        return bound & condition
+
+    @staticmethod
+    def _get_value(obj, field: str):
+        # `.values()` rows carry the ordering fields under their lookup name
+        if isinstance(obj, dict):
+            return obj[field.lstrip("-")]
+        value = obj
+        for attr in field.lstrip("-").split("__"):
+            value = getattr(value, attr)
+        return value
+
+    @staticmethod
+    def encode_cursor(values: list) -> str:
+        def default(value):
+            if isinstance(value, (datetime, date)):
+                # full precision, unlike DjangoJSONEncoder which drops microseconds
+                return value.isoformat()
+            if isinstance(value, (Decimal, UUID)):
+                return str(value)
+            raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+        raw = json.dumps(values, default=default, separators=(",", ":")).encode()
+        return urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str, size: int) -> list:
+        try:
+            values = json.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise HttpError(400, "Invalid cursor")
+        if not isinstance(values, list) or len(values) != size:
+            raise HttpError(400, "Invalid cursor")
+        return values
@@ -1,5 +1,7 @@
 from .routers import router as cart_router
+from .routers_guest import router as guest_cart_router
 
 __all__ = [
     'cart_router',
+    'guest_cart_router',
 ]
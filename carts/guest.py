@@ -0,0 +1,68 @@
+import secrets
+from typing import Dict, Optional, Set, Tuple
+
+from django.conf import settings
+from ninja.errors import HttpError
+
+from catalog.models import Product
+from .store import async_redis_client, cart_store, line_field, parse_cart_hash
+
+
+def guest_cart_key(token: str) -> str:
+    return f"guest_cart:{token}"
+
+
+async def acreate_guest_cart() -> str:
+    """Issue the token of a new (empty) guest cart."""
+    token = secrets.token_urlsafe(24)
+    async with async_redis_client().pipeline(transaction=True) as pipe:
+        # the marker field keeps the empty hash, and lets expired tokens be told apart
+        pipe.hset(guest_cart_key(token), "created", 1)
+        pipe.expire(guest_cart_key(token), settings.GUEST_CART_TTL_SECONDS)
+        await pipe.execute()
+    return token
+
+
+async def aget_guest_lines(token: str) -> Optional[Dict[int, int]]:
+    """The `{product_id: quantity}` lines of a guest cart, `None` when it doesn't exist (anymore)."""
+    state = await async_redis_client().hgetall(guest_cart_key(token))
+    return parse_cart_hash(state)[0] if state else None
+
+
+async def aapply_guest_changes(token: str, lines: Dict[int, Tuple[int, bool]], removed: Set[int]) -> bool:
+    """Apply folded changes (`fold_cart_changes`) to a guest cart, `False` when it doesn't exist."""
+    current = await aget_guest_lines(token)
+    if current is None:
+        return False
+    if len((current.keys() | lines.keys()) - removed) > settings.GUEST_CART_MAX_LINES:
+        raise HttpError(400, f"A guest cart holds at most {settings.GUEST_CART_MAX_LINES} products")
+
+    key = guest_cart_key(token)
+    async with async_redis_client().pipeline(transaction=True) as pipe:
+        for product_id, (quantity, replace) in lines.items():
+            (pipe.hset if replace else pipe.hincrby)(key, line_field(product_id), quantity)
+        if removed:
+            pipe.hdel(key, *map(line_field, removed))
+        pipe.expire(key, settings.GUEST_CART_TTL_SECONDS)
+        await pipe.execute()
+    return True
+
+
+async def amerge_guest_cart(user, token: str) -> int:
+    """Add the lines of a guest cart to the user's cart and drop it, return how many lines were merged.
+
+    The guest cart is read and deleted atomically, so a token can only be merged once,
+    and its lines are upserted into the user's cart in one statement. Products
+    deactivated since they were added are skipped.
+    """
+    async with async_redis_client().pipeline(transaction=True) as pipe:
+        pipe.hgetall(guest_cart_key(token))
+        pipe.delete(guest_cart_key(token))
+        state, _ = await pipe.execute()
+    lines, _ = parse_cart_hash(state)
+    active = {pk async for pk in Product.objects.filter(pk__in=lines, is_active=True).values_list("id", flat=True)} if lines else set()
+    lines = {product_id: (quantity, False) for product_id, quantity in lines.items() if product_id in active and quantity > 0}
+    if lines:
+        store = cart_store()
+        await store.aapply(await store.aopen(user), lines, set())
+    return len(lines)
@@ -0,0 +1,35 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from carts.store import flush_dirty_carts
+
+
+class Command(BaseCommand):
+    help = "Write the Redis carts changed since their last flush back to `Cart` / `CartItem` (CART_BACKEND=redis)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--watch", action="store_true", help="keep running and flush every --interval seconds")
+        parser.add_argument("--interval", type=float, default=settings.CART_FLUSH_INTERVAL_SECONDS)
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, watch, interval, batch_size, **options):
+        if not watch:
+            flushed = flush_dirty_carts(batch_size)
+            self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} carts"))
+            return
+
+        # Redis runs without persistence: on shutdown the dirty carts are flushed one last time
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+        while not stopping:
+            try:
+                if flushed := flush_dirty_carts(batch_size):
+                    self.stdout.write(f"Flushed {flushed} carts")
+            except Exception as exc:
+                # the failed carts stay dirty, keep watching
+                self.stderr.write(f"Cart flush failed: {exc!r}")
+            time.sleep(interval)
+        self.stdout.write(f"Flushed {flush_dirty_carts(batch_size)} carts before stopping")
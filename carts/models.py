@@ -1,7 +1,9 @@
 from django.conf import settings
 from django.db import models
+from decimal import Decimal, ROUND_HALF_UP
 from django.utils import timezone
-from django.db.models import F, Sum
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Least, Round
 
 from catalog.models import Product
 
@@ -60,12 +62,15 @@ class Cart(models.Model):
         return sum(item.product.price * item.quantity for item in self.items.all())
 
     def discount_amount(self):
+        return self.discount_for(self.subtotal())
+
+    def discount_for(self, subtotal):
         coupon = self.coupon
         if not coupon or not coupon.is_valid_now:
             return 0
-        subtotal = self.subtotal()
         if coupon.discount_type == Coupon.PERCENT:
-            return subtotal * (coupon.amount / 100)
+            # rounded to cents half away from zero, like `ROUND()` in `cart_totals`
+            return (subtotal * (coupon.amount / 100)).quantize(Decimal("0.01"), ROUND_HALF_UP)
         return min(coupon.amount, subtotal)
 
     def total(self):
@@ -89,3 +94,24 @@ class CartItem(models.Model):
 
     def __str__(self) -> str:
         return f"{self.quantity} x {self.product.name}"
+
+
+def cart_totals(now=None) -> dict:
+    """`items_subtotal`, `coupon_discount` and `grand_total` annotations of a `Cart` queryset.
+
+    Computed by the database in the cart query itself, with the same rules as
+    `Cart.discount_for` (percent discounts are rounded to cents).
+    """
+    now = now or timezone.now()
+    money = DecimalField(max_digits=12, decimal_places=2)
+    subtotal = Coalesce(Sum(F('items__product__price') * F('items__quantity')), Value(Decimal(0)), output_field=money)
+    valid = Q(coupon__active=True) \
+        & (Q(coupon__valid_from__isnull=True) | Q(coupon__valid_from__lte=now)) \
+        & (Q(coupon__valid_to__isnull=True) | Q(coupon__valid_to__gte=now))
+    discount = Case(
+        When(valid & Q(coupon__discount_type=Coupon.PERCENT), then=Round(subtotal * F('coupon__amount') / 100, 2)),
+        When(valid & Q(coupon__discount_type=Coupon.AMOUNT), then=Least(F('coupon__amount'), subtotal)),
+        default=Value(Decimal(0)),
+        output_field=money,
+    )
+    return {'items_subtotal': subtotal, 'coupon_discount': discount, 'grand_total': subtotal - discount}
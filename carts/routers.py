@@ -1,107 +1,87 @@
-from asgiref.sync import sync_to_async
 from typing import List
-from decimal import Decimal
 
 from django.http import Http404
-from django.db.models import Avg, F
 
-from ninja import Router
+from ninja import Body, Router, Query
 from ninja_jwt.authentication import AsyncJWTAuth
 
 from catalog.models import Product
-from .models import CartItem, Cart
-from .utils import get_or_create_open_cart, apply_coupon_to_cart
-from .schemas import CartItemIn, CartOut, CartItemOut, CouponIn, CouponOut
-from catalog.schemas import ProductOut
+from catalog.fragments import PRODUCT_RELATIONS, product_fields
+from base.fieldsets import FieldsetQuery
+from .store import cart_store, fold_cart_changes
+from .utils import get_valid_coupon
+from .schemas import CART_BATCH_MAX_CHANGES, CartItemIn, CartItemChangeIn, CartOut, CartItemOut, CartSummaryOut, CouponIn, CouponOut
 
 router = Router(auth=AsyncJWTAuth(), tags=["cart"])
 
 
-async def serialize_cart(cart) -> CartOut:
-    # getting items scheme
-    items = await sync_to_async(list)(
-        CartItem.objects.filter(cart=cart).prefetch_related("product", "product__images", "product__ratings")
-        .select_related(
-            'product__category', 'product__brand'
-        )
-        .annotate(avarage_rating=Avg("product__ratings__rating"))
-        .annotate(line_total=F("product__price") * F("quantity")).all()
-    )
-    cart._prefetched_objects_cache = {"items": items}
-
-    # item_schemas: List[CartItemOut] = []
-    # for item in items:
-    #     line_total = item.product.price * item.quantity
-    #     item_schemas.append(CartItemOut(
-    #         product=ProductOut(item.product),
-    #         quantity=int(item.quantity),
-    #         line_total=Decimal(line_total),
-    #     ))
-    subtotal = await sync_to_async(cart.subtotal)()
-    discount = await sync_to_async(cart.discount_amount)()
-    total = await sync_to_async(cart.total)()
-    cart_schema = CartOut(
-        id=cart.id,
-        items=items,
-        subtotal=Decimal(subtotal),
-        discount=Decimal(discount),
-        total=Decimal(total),
-        coupon=cart.coupon,
-    )
-    return cart_schema
+@router.get("/cart", response=CartOut)
+async def get_cart(request, fieldset: Query[FieldsetQuery]):
+    # `fields` / `expand` apply to the products of the cart lines
+    selected = fieldset.resolve(product_fields("list"), PRODUCT_RELATIONS)
+    store = cart_store()
+    cart = await store.aopen(request.user)
+    return await store.aresponse(cart, selected)
 
 
-@router.get("/cart", response=CartOut)
-async def get_cart(request):
-    cart = await get_or_create_open_cart(request.user)
-    return await serialize_cart(cart)
+@router.get("/cart/summary", response=CartSummaryOut)
+async def get_cart_summary(request):
+    """Line count, quantity and totals without the products, cheap enough for every page load."""
+    return await cart_store().asummary(request.user)
 
 
 @router.post("/cart", response=CartOut)
 async def add_to_cart(request, payload: CartItemIn):
-    cart = await get_or_create_open_cart(request.user)
-    product = await Product.objects.filter(pk=payload.product_id, is_active=True).only('id').afirst()
-    if not product:
+    store = cart_store()
+    cart = await store.aopen(request.user)
+    if not await Product.objects.filter(pk=payload.product_id, is_active=True).aexists():
         raise Http404("Product not found")
 
-    updated = await CartItem.objects.filter(cart=cart, product=product).aupdate(quantity=F('quantity') + payload.quantity)
-    if not updated:
-        # If no rows were updated, the item doesn't exist. Create it.
-        item = CartItem(cart=cart, product=product, quantity=payload.quantity)
-        await item.asave()
-
-    return await serialize_cart(cart)
+    await store.aadd(cart, payload.product_id, payload.quantity)
+    return await store.aresponse(cart)
 
 
 @router.put("/cart", response=CartOut)
 async def update_cart_item(request, payload: CartItemIn):
-    cart = await get_or_create_open_cart(request.user)
-    product = await sync_to_async(Product.objects.filter(pk=payload.product_id, is_active=True).first)()
-    if not product:
+    store = cart_store()
+    cart = await store.aopen(request.user)
+    if not await Product.objects.filter(pk=payload.product_id, is_active=True).aexists():
         raise Http404("Product not found")
-    item = await sync_to_async(CartItem.objects.filter(cart=cart, product=product).first)()
-    if not item:
+    if not await store.aset(cart, payload.product_id, payload.quantity):
         raise Http404("Item not found in cart")
-
-    if payload.quantity <= 0:
-        await item.adelete()
-    else:
-        item.quantity = payload.quantity
-        await item.asave()
-    return await serialize_cart(cart)
+    return await store.aresponse(cart)
 
 
 @router.delete("/cart", response=CartOut)
 async def remove_from_cart(request, payload: CartItemIn):
-    cart = await get_or_create_open_cart(request.user)
-    item = await sync_to_async(CartItem.objects.filter(cart=cart, product_id=payload.product_id).first)()
-    if item:
-        await sync_to_async(item.delete)()
-    return await serialize_cart(cart)
+    store = cart_store()
+    cart = await store.aopen(request.user)
+    await store.aremove(cart, payload.product_id)
+    return await store.aresponse(cart)
+
+
+@router.post("/cart/items:batch", response=CartOut)
+async def batch_update_cart(request, payload: List[CartItemChangeIn] = Body(..., max_length=CART_BATCH_MAX_CHANGES)):
+    """Apply a list of changes in order, then return the cart once.
+
+    `set` creates the line when it is not in the cart yet. The products added or set
+    are validated together, and if one is missing or inactive nothing is applied.
+    """
+    store = cart_store()
+    cart = await store.aopen(request.user)
+    lines, removed = fold_cart_changes(payload)
+    found = {pk async for pk in Product.objects.filter(pk__in=lines, is_active=True).values_list("id", flat=True)}
+    if missing := [product_id for product_id in lines if product_id not in found]:
+        raise Http404(f"Products not found: {', '.join(map(str, missing))}")
+
+    await store.aapply(cart, lines, removed)
+    return await store.aresponse(cart)
 
 
 @router.post("/cart/apply-coupon", response=CartOut)
 async def apply_coupon(request, payload: CouponIn):
-    cart = await get_or_create_open_cart(request.user)
-    await apply_coupon_to_cart(cart, payload.code)
-    return await serialize_cart(cart)
+    store = cart_store()
+    cart = await store.aopen(request.user)
+    if coupon := await get_valid_coupon(payload.code):
+        await store.aset_coupon(cart, coupon)
+    return await store.aresponse(cart)
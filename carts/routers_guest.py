@@ -0,0 +1,62 @@
+from decimal import Decimal
+from typing import List
+
+from django.http import Http404, HttpResponse
+
+from ninja import Body, Header, Router, Query
+
+from catalog.models import Product
+from catalog.fragments import PRODUCT_RELATIONS, product_fields, aget_product_fragments, assemble, assemble_list, json_response
+from base.fieldsets import FieldsetQuery
+from .guest import acreate_guest_cart, aget_guest_lines, aapply_guest_changes
+from .store import fold_cart_changes
+from .schemas import CART_BATCH_MAX_CHANGES, CartItemChangeIn, GuestCartOut
+
+# carts of visitors who aren't logged in, identified by the token issued by `POST /guest-cart`
+# and passed back in the `X-Guest-Cart` header; `/auth/login` and `/auth/signup` merge them
+router = Router(tags=["guest cart"])
+
+
+async def serialize_guest_cart(token: str, lines: dict, selected=None) -> HttpResponse:
+    prices = {pk: price async for pk, price in Product.objects.filter(id__in=lines).values_list("id", "price")} if lines else {}
+    items = [
+        {"product_id": product_id, "quantity": quantity, "line_total": prices[product_id] * quantity}
+        for product_id, quantity in lines.items() if product_id in prices
+    ]
+    fragments = await aget_product_fragments(list(lines), "list", selected)
+    return json_response(assemble({
+        "token": token,
+        "items": assemble_list(
+            assemble({"product": fragments[item["product_id"]], "quantity": item["quantity"], "line_total": item["line_total"]})
+            for item in items if item["product_id"] in fragments
+        ),
+        "subtotal": sum((item["line_total"] for item in items), Decimal(0)),
+    }))
+
+
+@router.post("/guest-cart", response=GuestCartOut)
+async def create_guest_cart(request):
+    return await serialize_guest_cart(await acreate_guest_cart(), {})
+
+
+@router.get("/guest-cart", response=GuestCartOut)
+async def get_guest_cart(request, fieldset: Query[FieldsetQuery], token: str = Header(..., alias="X-Guest-Cart")):
+    # `fields` / `expand` apply to the products of the cart lines
+    selected = fieldset.resolve(product_fields("list"), PRODUCT_RELATIONS)
+    lines = await aget_guest_lines(token)
+    if lines is None:
+        raise Http404("Guest cart not found")
+    return await serialize_guest_cart(token, lines, selected)
+
+
+@router.post("/guest-cart/items:batch", response=GuestCartOut)
+async def batch_update_guest_cart(request, payload: List[CartItemChangeIn] = Body(..., max_length=CART_BATCH_MAX_CHANGES), token: str = Header(..., alias="X-Guest-Cart")):
+    """Same changes as `POST /cart/items:batch`."""
+    lines, removed = fold_cart_changes(payload)
+    found = {pk async for pk in Product.objects.filter(pk__in=lines, is_active=True).values_list("id", flat=True)}
+    if missing := [product_id for product_id in lines if product_id not in found]:
+        raise Http404(f"Products not found: {', '.join(map(str, missing))}")
+
+    if not await aapply_guest_changes(token, lines, removed):
+        raise Http404("Guest cart not found")
+    return await serialize_guest_cart(token, await aget_guest_lines(token) or {})
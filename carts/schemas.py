@@ -1,9 +1,10 @@
-from typing import Optional, List
-from ninja import ModelSchema, Schema
+from typing import Literal, Optional, List
+from ninja import Field, ModelSchema, Schema
+from pydantic import model_validator
 from decimal import Decimal
 
 from carts.models import Coupon
-from catalog.schemas import ProductOut
+from catalog.schemas import ProductListOut
 
 
 class CouponIn(Schema):
@@ -24,8 +25,25 @@ class CartItemIn(Schema):
     quantity: Optional[int] = 1
 
 
+class CartItemChangeIn(Schema):
+    """One change of `POST /cart/items:batch`: `add` to the line, `set` it (0 removes it) or `remove` it."""
+    product_id: int
+    quantity: int = Field(1, ge=0)
+    mode: Literal["add", "set", "remove"] = "add"
+
+    @model_validator(mode='after')
+    def check_quantity(self):
+        if self.mode == "add" and self.quantity < 1:
+            raise ValueError('add needs a quantity of at least 1')
+        return self
+
+
+# changes accepted by one request of the batch endpoints
+CART_BATCH_MAX_CHANGES = 100
+
+
 class CartItemOut(Schema):
-    product: ProductOut
+    product: ProductListOut
     quantity: int
     line_total: Decimal
 
@@ -37,3 +55,17 @@ class CartOut(Schema):
     discount: Decimal
     total: Decimal
     coupon: Optional[CouponOut] = None
+
+
+class CartSummaryOut(Schema):
+    items: int  # distinct products
+    quantity: int
+    subtotal: Decimal
+    discount: Decimal
+    total: Decimal
+
+
+class GuestCartOut(Schema):
+    token: str
+    items: List[CartItemOut]
+    subtotal: Decimal
@@ -0,0 +1,412 @@
+import asyncio
+import weakref
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import redis
+import redis.asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse
+
+from catalog.fragments import aget_product_fragments, assemble, assemble_list, json_response
+from catalog.models import Product
+from .models import Cart, CartItem, Coupon, cart_totals
+from .schemas import CouponOut
+from .utils import get_or_create_open_cart
+
+
+def render_cart(cart_id: int, items: List[dict], fragments: dict, subtotal, discount, coupon: Optional[Coupon]) -> HttpResponse:
+    """The `CartOut` body from plain `product_id` / `quantity` / `line_total` rows and the product fragments."""
+    return json_response(assemble({
+        "id": cart_id,
+        "items": assemble_list(
+            assemble({"product": fragments[item["product_id"]], "quantity": item["quantity"], "line_total": item["line_total"]})
+            for item in items if item["product_id"] in fragments
+        ),
+        "subtotal": subtotal,
+        "discount": discount,
+        "total": subtotal - discount,
+        "coupon": CouponOut.from_orm(coupon).model_dump() if coupon else None,
+    }))
+
+
+async def serialize_cart(cart: Cart, selected=None) -> HttpResponse:
+    """Two queries: the cart with its coupon and SQL computed totals, then its lines as plain rows.
+
+    The products themselves come from the fragment cache (or, with a sparse fieldset
+    of the products, from a query selecting just those fields).
+    """
+    cart = await Cart.objects.filter(pk=cart.pk).select_related("coupon").annotate(**cart_totals()).aget()
+    items = [
+        item async for item in CartItem.objects.filter(cart=cart).order_by("id")
+        .values("product_id", "quantity", line_total=F("product__price") * F("quantity"))
+    ]
+    fragments = await aget_product_fragments([item["product_id"] for item in items], "list", selected)
+    return render_cart(cart.id, items, fragments, cart.items_subtotal, cart.coupon_discount, cart.coupon)
+
+
+def fold_cart_changes(changes: Iterable) -> Tuple[Dict[int, Tuple[int, bool]], Set[int]]:
+    """Collapse a batch of changes, applied in order, into one per product.
+
+    Returns `({product_id: (quantity, replace)}, removed_product_ids)`: a `replace`
+    line is set to `quantity`, the others have `quantity` added to them.
+    """
+    final = {}
+    for change in changes:
+        if change.mode == "remove" or (change.mode == "set" and change.quantity <= 0):
+            final[change.product_id] = None
+        elif change.mode == "set":
+            final[change.product_id] = (change.quantity, True)
+        elif change.product_id in final:
+            # an add after a set or a remove of the same batch is relative to it
+            quantity, replace = final[change.product_id] or (0, True)
+            final[change.product_id] = (quantity + change.quantity, replace)
+        else:
+            final[change.product_id] = (change.quantity, False)
+
+    removed = {product_id for product_id, line in final.items() if line is None or line == (0, True)}
+    return {product_id: line for product_id, line in final.items() if product_id not in removed}, removed
+
+
+# one statement for a whole batch: the removed lines are deleted, the others upserted
+# (set to their quantity when replaced, incremented otherwise)
+APPLY_CHANGES_SQL = f"""
+WITH removed AS (
+    DELETE FROM {CartItem._meta.db_table} WHERE cart_id = %(cart)s AND product_id = ANY(%(removed)s::bigint[])
+)
+INSERT INTO {CartItem._meta.db_table} (cart_id, product_id, quantity)
+SELECT %(cart)s, * FROM unnest(%(products)s::bigint[], %(quantities)s::integer[])
+ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = CASE
+    WHEN EXCLUDED.product_id = ANY(%(replaced)s::bigint[]) THEN EXCLUDED.quantity
+    ELSE {CartItem._meta.db_table}.quantity + EXCLUDED.quantity
+END
+"""
+
+
+class DatabaseCartStore:
+    """Open carts as `Cart` / `CartItem` rows, every write goes straight to the database."""
+
+    async def aopen(self, user) -> Cart:
+        return await get_or_create_open_cart(user)
+
+    async def aadd(self, cart: Cart, product_id: int, quantity: int):
+        updated = await CartItem.objects.filter(cart=cart, product_id=product_id).aupdate(quantity=F('quantity') + quantity)
+        if not updated:
+            # If no rows were updated, the item doesn't exist. Create it.
+            await CartItem.objects.acreate(cart=cart, product_id=product_id, quantity=quantity)
+
+    async def aset(self, cart: Cart, product_id: int, quantity: int) -> bool:
+        """Set the quantity of a line (remove it when `quantity <= 0`), `False` when it is not in the cart."""
+        item = await CartItem.objects.filter(cart=cart, product_id=product_id).afirst()
+        if not item:
+            return False
+        if quantity <= 0:
+            await item.adelete()
+        else:
+            item.quantity = quantity
+            await item.asave(update_fields=["quantity"])
+        return True
+
+    async def aremove(self, cart: Cart, product_id: int):
+        await CartItem.objects.filter(cart=cart, product_id=product_id).adelete()
+
+    async def aapply(self, cart: Cart, lines: Dict[int, Tuple[int, bool]], removed: Set[int]):
+        """Apply folded changes (`fold_cart_changes`) in a single statement."""
+        def apply():
+            with connection.cursor() as cursor:
+                cursor.execute(APPLY_CHANGES_SQL, {
+                    "cart": cart.pk,
+                    "removed": list(removed),
+                    "products": list(lines),
+                    "quantities": [quantity for quantity, _ in lines.values()],
+                    "replaced": [product_id for product_id, (_, replace) in lines.items() if replace],
+                })
+        await sync_to_async(apply)()
+
+    async def aset_coupon(self, cart: Cart, coupon: Coupon):
+        cart.coupon = coupon
+        await cart.asave()
+
+    async def aresponse(self, cart: Cart, selected=None) -> HttpResponse:
+        return await serialize_cart(cart, selected)
+
+    async def asummary(self, user) -> dict:
+        """One aggregate query over the user's cart, nothing is created when they have none yet."""
+        summary = await Cart.objects.filter(user=user).annotate(
+            items_count=Count('items'), items_quantity=Coalesce(Sum('items__quantity'), 0), **cart_totals(),
+        ).values('items_count', 'items_quantity', 'items_subtotal', 'coupon_discount', 'grand_total').afirst()
+        if not summary:
+            return {"items": 0, "quantity": 0, "subtotal": Decimal(0), "discount": Decimal(0), "total": Decimal(0)}
+        return {
+            "items": summary["items_count"],
+            "quantity": summary["items_quantity"],
+            "subtotal": summary["items_subtotal"],
+            "discount": summary["coupon_discount"],
+            "total": summary["grand_total"],
+        }
+
+    async def aflush(self, user):
+        """Nothing to write back, the database is the store."""
+
+    async def adiscard(self, user):
+        """Nothing to drop, checkout empties the `Cart` itself."""
+
+
+# every cart written since its last flush, `flush_dirty_carts` pops them
+DIRTY_CARTS_KEY = "cart:dirty"
+
+# a checkout holds its cart's lock from the flush to the discard, writes wait for it; it expires
+# after this many seconds in case the request dies in between
+CHECKOUT_LOCK_SECONDS = 30
+CHECKOUT_LOCK_POLL_SECONDS = 0.05
+
+
+def cart_key(user_id: int) -> str:
+    return f"cart:{user_id}"
+
+
+def checkout_lock_key(user_id: int) -> str:
+    return f"cart:{user_id}:checkout"
+
+
+def line_field(product_id: int) -> str:
+    return f"p:{product_id}"
+
+
+@dataclass
+class RedisCart:
+    user: object
+    key: str
+    id: int
+
+
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def redis_client() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+def async_redis_client() -> redis.asyncio.Redis:
+    # asyncio connections belong to the event loop that opened them
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        _async_clients[loop] = redis.asyncio.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _async_clients[loop]
+
+
+def parse_cart_hash(state: Dict[str, str]):
+    """`(lines, coupon_id)` of a cart hash, the lines as `{product_id: quantity}` ordered by product."""
+    lines = {int(field[2:]): int(value) for field, value in state.items() if field.startswith("p:")}
+    return dict(sorted(lines.items())), int(state["coupon"]) if state.get("coupon") else None
+
+
+class RedisCartStore:
+    """Open carts as Redis hashes, written back to `Cart` / `CartItem` behind the requests.
+
+    A cart is the hash `cart:<user id>` holding its database `id`, its `coupon` id and
+    one `p:<product id>` → quantity field per line, loaded from the database on first
+    use. Writes only touch Redis and add the user to `cart:dirty`; `flush_dirty_carts`
+    (`manage.py flush_carts --watch`) persists those carts, and checkout flushes the
+    buyer's cart synchronously before reading it from the database, then drops it.
+    Writes arriving during a checkout wait for it and go to the user's next cart.
+    """
+
+    async def aopen(self, user) -> RedisCart:
+        client, key = async_redis_client(), cart_key(user.pk)
+        while True:
+            if cart_id := await client.hget(key, "id"):
+                return RedisCart(user, key, int(cart_id))
+
+            cart = await get_or_create_open_cart(user)
+            state = {"id": cart.id, "coupon": cart.coupon_id or ""}
+            async for product_id, quantity in CartItem.objects.filter(cart=cart).values_list("product_id", "quantity"):
+                state[line_field(product_id)] = quantity
+            try:
+                async with client.pipeline(transaction=True) as pipe:
+                    # a concurrent request may have loaded (and already changed) the cart meanwhile
+                    await pipe.watch(key)
+                    if await pipe.hexists(key, "id"):
+                        continue
+                    # fields already there (a hash left without its `id`) are kept
+                    pipe.multi()
+                    for field, value in state.items():
+                        pipe.hsetnx(key, field, value)
+                    pipe.expire(key, settings.CART_REDIS_TTL_SECONDS)
+                    await pipe.execute()
+                return RedisCart(user, key, cart.id)
+            except redis.WatchError:
+                continue
+
+    async def _awrite(self, cart: RedisCart, *commands, line: Optional[str] = None) -> bool:
+        """Run `commands` on the cart hash in one transaction that also refreshes its TTL and marks it dirty.
+
+        The hash is checked in the same transaction: the write waits while the cart is
+        checked out, and reloads it when it was dropped meanwhile (by the checkout or the
+        expiry). With `line`, nothing is written and `False` returned when that line isn't in the cart.
+        """
+        client, lock_key = async_redis_client(), checkout_lock_key(cart.user.pk)
+        while True:
+            try:
+                async with client.pipeline(transaction=True) as pipe:
+                    await pipe.watch(cart.key, lock_key)
+                    if await pipe.exists(lock_key):
+                        await asyncio.sleep(CHECKOUT_LOCK_POLL_SECONDS)
+                        continue
+                    if not await pipe.hexists(cart.key, "id"):
+                        await pipe.unwatch()
+                        await self.aopen(cart.user)
+                        continue
+                    if line and not await pipe.hexists(cart.key, line):
+                        return False
+                    pipe.multi()
+                    for name, *args in commands:
+                        getattr(pipe, name)(*args)
+                    pipe.expire(cart.key, settings.CART_REDIS_TTL_SECONDS)
+                    pipe.sadd(DIRTY_CARTS_KEY, cart.user.pk)
+                    await pipe.execute()
+                return True
+            except redis.WatchError:
+                continue
+
+    async def aadd(self, cart: RedisCart, product_id: int, quantity: int):
+        await self._awrite(cart, ("hincrby", cart.key, line_field(product_id), quantity))
+
+    async def aset(self, cart: RedisCart, product_id: int, quantity: int) -> bool:
+        """Set the quantity of a line (remove it when `quantity <= 0`), `False` when it is not in the cart."""
+        field = line_field(product_id)
+        command = ("hdel", cart.key, field) if quantity <= 0 else ("hset", cart.key, field, quantity)
+        return await self._awrite(cart, command, line=field)
+
+    async def aremove(self, cart: RedisCart, product_id: int):
+        await self._awrite(cart, ("hdel", cart.key, line_field(product_id)))
+
+    async def aapply(self, cart: RedisCart, lines: Dict[int, Tuple[int, bool]], removed: Set[int]):
+        """Apply folded changes (`fold_cart_changes`) in one transaction."""
+        commands = [("hset" if replace else "hincrby", cart.key, line_field(product_id), quantity) for product_id, (quantity, replace) in lines.items()]
+        if removed:
+            commands.append(("hdel", cart.key, *map(line_field, removed)))
+        await self._awrite(cart, *commands)
+
+    async def aset_coupon(self, cart: RedisCart, coupon: Coupon):
+        await self._awrite(cart, ("hset", cart.key, "coupon", coupon.pk))
+
+    async def _atotals(self, state: Dict[str, str]):
+        """`(lines, items, subtotal, discount, coupon)` of a cart hash, with the rules of `cart_totals`."""
+        lines, coupon_id = parse_cart_hash(state)
+        prices = {pk: price async for pk, price in Product.objects.filter(id__in=lines).values_list("id", "price")} if lines else {}
+        coupon = await Coupon.objects.filter(pk=coupon_id).afirst() if coupon_id else None
+
+        items = [
+            {"product_id": product_id, "quantity": quantity, "line_total": prices[product_id] * quantity}
+            for product_id, quantity in lines.items() if product_id in prices
+        ]
+        subtotal = sum((item["line_total"] for item in items), Decimal(0))
+        discount = Decimal(Cart(coupon=coupon).discount_for(subtotal))
+        return lines, items, subtotal, discount, coupon
+
+    async def aresponse(self, cart: RedisCart, selected=None) -> HttpResponse:
+        lines, items, subtotal, discount, coupon = await self._atotals(await async_redis_client().hgetall(cart.key))
+        fragments = await aget_product_fragments(list(lines), "list", selected)
+        return render_cart(cart.id, items, fragments, subtotal, discount, coupon)
+
+    async def asummary(self, user) -> dict:
+        """From the hash and one price query, or from the database when the cart isn't loaded."""
+        state = await async_redis_client().hgetall(cart_key(user.pk))
+        if not state:
+            return await DatabaseCartStore().asummary(user)
+        _, items, subtotal, discount, _ = await self._atotals(state)
+        return {
+            "items": len(items),
+            "quantity": sum(item["quantity"] for item in items),
+            "subtotal": subtotal,
+            "discount": discount,
+            "total": subtotal - discount,
+        }
+
+    async def aflush(self, user):
+        """Lock the cart for the checkout and write it to the database now, as checkout reads it from there."""
+        client = async_redis_client()
+        # one checkout of the cart at a time, the second one then finds it checked out
+        while not await client.set(checkout_lock_key(user.pk), 1, nx=True, ex=CHECKOUT_LOCK_SECONDS):
+            await asyncio.sleep(CHECKOUT_LOCK_POLL_SECONDS)
+        await client.srem(DIRTY_CARTS_KEY, user.pk)
+        await sync_to_async(flush_cart)(user.pk)
+
+    async def adiscard(self, user):
+        """Drop the cart after the checkout and release its lock.
+
+        It was flushed by `aflush`, so nothing is lost when no order was placed either:
+        the cart is reloaded from the database on next use (empty once checked out).
+        """
+        async with async_redis_client().pipeline(transaction=True) as pipe:
+            pipe.delete(cart_key(user.pk))
+            pipe.srem(DIRTY_CARTS_KEY, user.pk)
+            pipe.delete(checkout_lock_key(user.pk))
+            await pipe.execute()
+
+
+def flush_cart(user_id: int) -> bool:
+    """Make the user's `Cart` / `CartItem` rows match their Redis cart, `False` when there is nothing to write."""
+    with transaction.atomic():
+        # locked before the hash is read: checkout holds this lock until its cart is checked out
+        cart = Cart.objects.select_for_update().filter(user_id=user_id).first()
+        state = redis_client().hgetall(cart_key(user_id))
+        if not state:
+            return False
+        if cart is not None and cart.status != Cart.STATUS_OPEN:
+            # loading a cart reopens it, so this hash predates a checkout: its lines were bought
+            redis_client().delete(cart_key(user_id))
+            return False
+        if cart is None:
+            cart = Cart.objects.create(user_id=user_id)
+
+        lines, coupon_id = parse_cart_hash(state)
+        # products and coupons deleted since they were added are dropped, like their rows would have been
+        existing = set(Product.objects.filter(id__in=[pk for pk, quantity in lines.items() if quantity > 0]).values_list("id", flat=True))
+        if coupon_id and not Coupon.objects.filter(pk=coupon_id).exists():
+            coupon_id = None
+        Cart.objects.filter(pk=cart.pk).update(coupon_id=coupon_id)
+
+        CartItem.objects.filter(cart=cart).exclude(product_id__in=existing).delete()
+        CartItem.objects.bulk_create(
+            [CartItem(cart=cart, product_id=product_id, quantity=quantity) for product_id, quantity in lines.items() if product_id in existing],
+            update_conflicts=True, unique_fields=["cart", "product"], update_fields=["quantity"],
+        )
+    return True
+
+
+def flush_dirty_carts(batch_size: int = 100) -> int:
+    """Flush every cart written since its last flush, return how many were flushed.
+
+    Carts are popped from the dirty set before being read, so a write landing during
+    the flush marks its cart dirty again instead of being lost.
+    """
+    client, flushed = redis_client(), 0
+    while user_ids := client.spop(DIRTY_CARTS_KEY, batch_size):
+        for index, user_id in enumerate(user_ids):
+            try:
+                flush_cart(int(user_id))
+            except Exception:
+                # retried on the next run
+                client.sadd(DIRTY_CARTS_KEY, *user_ids[index:])
+                raise
+            flushed += 1
+    return flushed
+
+
+def cart_store():
+    """The store selected by `CART_BACKEND`."""
+    return _STORES[settings.CART_BACKEND]
+
+
+_STORES = {"db": DatabaseCartStore(), "redis": RedisCartStore()}
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+from datetime import timedelta
+from unittest import skipUnless
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from ninja_jwt.tokens import RefreshToken
+
+from catalog.models import Product
+from orders.checkout import place_order
+from orders.models import Order, OrderItem
+from users.models import Address, User
+from . import store
+from .models import Cart, CartItem, Coupon
+
+
+# Redis carts are kept under `cart:<user id>` keys, so they are only tested against a disposable database
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL")
+
+
+@override_settings(
+    CART_BACKEND="db",
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    CACHALOT_ENABLED=False,
+)
+class CartTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="user@example.com", password="pw", username="user")
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def post(self, path, payload):
+        return self.client.post(path, json.dumps(payload), content_type="application/json", **self.auth)
+
+    def lines(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list("product_id", "quantity"))
+
+
+class CartTotalsTests(CartTestCase):
+    def setUp(self):
+        super().setUp()
+        # bulk_create skips the signals syncing coupons to the payment providers
+        self.percent, self.amount = Coupon.objects.bulk_create([
+            Coupon(code="TEN", amount="10"),
+            Coupon(code="FIVE", discount_type=Coupon.AMOUNT, amount="5"),
+        ])
+
+    def totals(self, body):
+        return body["subtotal"], body["discount"], body["total"]
+
+    def test_percent_discount_is_rounded_the_same_by_cart_summary_and_order(self):
+        Address.objects.create(user=self.user, line1="Street", city="Cairo", phone_number="01012345678", is_default=True)
+        product = Product.objects.create(name="P", price="0.25")
+        self.post("/api/v1/cart", {"product_id": product.pk})
+        # 10% of 0.25 is 0.025, rounded half up
+        cart = self.post("/api/v1/cart/apply-coupon", {"code": "TEN"}).json()
+        self.assertEqual(self.totals(cart), ("0.25", "0.03", "0.22"))
+        self.assertEqual(self.totals(self.client.get("/api/v1/cart/summary", **self.auth).json()), ("0.25", "0.03", "0.22"))
+
+        order = self.post("/api/v1/orders", {}).json()
+        self.assertEqual((order["discount_amount"], order["total_amount"]), ("0.03", "0.22"))
+        self.assertEqual(str(Order.objects.get(pk=order["id"]).discount_amount), "0.03")
+
+    def test_amount_discount_is_capped_at_the_subtotal(self):
+        product = Product.objects.create(name="P", price="1.50")
+        self.post("/api/v1/cart", {"product_id": product.pk, "quantity": 2})
+        cart = self.post("/api/v1/cart/apply-coupon", {"code": "FIVE"}).json()
+        self.assertEqual(self.totals(cart), ("3.00", "3.00", "0.00"))
+
+    def test_expired_coupon_gives_no_discount(self):
+        product = Product.objects.create(name="P", price="10")
+        self.post("/api/v1/cart", {"product_id": product.pk})
+        self.post("/api/v1/cart/apply-coupon", {"code": "TEN"})
+        Coupon.objects.filter(pk=self.percent.pk).update(valid_to=timezone.now() - timedelta(days=1))
+        self.assertEqual(self.totals(self.client.get("/api/v1/cart", **self.auth).json()), ("10.00", "0", "10.00"))
+
+    def test_summary_without_a_cart(self):
+        summary = self.client.get("/api/v1/cart/summary", **self.auth).json()
+        self.assertEqual(summary, {"items": 0, "quantity": 0, "subtotal": "0", "discount": "0", "total": "0"})
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+
+class CartBatchTests(CartTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = [Product.objects.create(name=f"P{i}", price=i + 1) for i in range(3)]
+        self.ids = [product.pk for product in self.products]
+
+    def test_changes_are_applied_in_order(self):
+        self.post("/api/v1/cart", {"product_id": self.ids[2], "quantity": 4})
+        response = self.post("/api/v1/cart/items:batch", [
+            {"product_id": self.ids[0], "quantity": 2},
+            {"product_id": self.ids[0]},
+            {"product_id": self.ids[1], "quantity": 5, "mode": "set"},
+            {"product_id": self.ids[1], "quantity": 1},
+            {"product_id": self.ids[2], "mode": "remove"},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.lines(), {self.ids[0]: 3, self.ids[1]: 6})
+
+    def test_set_to_zero_removes_the_line(self):
+        self.post("/api/v1/cart", {"product_id": self.ids[0]})
+        self.post("/api/v1/cart/items:batch", [{"product_id": self.ids[0], "quantity": 0, "mode": "set"}])
+        self.assertEqual(self.lines(), {})
+
+    def test_invalid_batches_change_nothing(self):
+        batches = {
+            "zero add": [{"product_id": self.ids[0], "quantity": 0}],
+            "too many changes": [{"product_id": self.ids[0]}] * 101,
+            "unknown product": [{"product_id": self.ids[0]}, {"product_id": 0}],
+        }
+        for name, batch in batches.items():
+            with self.subTest(batch=name):
+                self.assertIn(self.post("/api/v1/cart/items:batch", batch).status_code, (404, 422))
+                self.assertEqual(self.lines(), {})
+
+
+@skipUnless(TEST_REDIS_URL, "set TEST_REDIS_URL to a disposable Redis database")
+@override_settings(CART_BACKEND="redis", REDIS_URL=TEST_REDIS_URL)
+class RedisCartStoreTests(CartTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reset_clients()
+        self.addCleanup(self.reset_clients)
+        store.redis_client().flushdb()
+        self.products = [Product.objects.create(name=f"P{i}", price=i + 1) for i in range(3)]
+        self.ids = [product.pk for product in self.products]
+
+    def reset_clients(self):
+        # the clients are kept per process (and event loop), they must not outlive the REDIS_URL override
+        store._client = None
+        store._async_clients.clear()
+
+    def test_writes_are_flushed_to_the_database(self):
+        self.post("/api/v1/cart", {"product_id": self.ids[0], "quantity": 2})
+        self.post("/api/v1/cart/items:batch", [{"product_id": self.ids[1], "quantity": 3}])
+        self.assertEqual(self.lines(), {})
+
+        self.assertEqual(store.flush_dirty_carts(), 1)
+        self.assertEqual(self.lines(), {self.ids[0]: 2, self.ids[1]: 3})
+        self.assertFalse(store.redis_client().smembers(store.DIRTY_CARTS_KEY))
+
+    def test_setting_a_line_not_in_the_cart_changes_nothing(self):
+        self.post("/api/v1/cart", {"product_id": self.ids[0]})
+        response = self.client.put("/api/v1/cart", json.dumps({"product_id": self.ids[1], "quantity": 2}), content_type="application/json", **self.auth)
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(store.line_field(self.ids[1]), store.redis_client().hgetall(store.cart_key(self.user.pk)))
+
+    async def test_write_during_checkout_goes_to_the_next_cart(self):
+        await Address.objects.acreate(user=self.user, line1="Street", city="Cairo", phone_number="01012345678", is_default=True)
+        redis_store = store.RedisCartStore()
+        cart = await redis_store.aopen(self.user)
+        await redis_store.aadd(cart, self.ids[0], 2)
+
+        await redis_store.aflush(self.user)
+        write = asyncio.create_task(redis_store.aadd(cart, self.ids[1], 1))
+        await asyncio.sleep(0.2)
+        self.assertFalse(write.done())
+        order, error = await sync_to_async(place_order)(self.user)
+        await redis_store.adiscard(self.user)
+        await write
+
+        self.assertIsNone(error)
+        self.assertEqual([row async for row in OrderItem.objects.filter(order=order).values_list("product_id", "quantity")], [(self.ids[0], 2)])
+        lines, _ = store.parse_cart_hash(await store.async_redis_client().hgetall(cart.key))
+        self.assertEqual(lines, {self.ids[1]: 1})
+        self.assertEqual((await Cart.objects.aget(user=self.user)).status, Cart.STATUS_OPEN)
+
+    def test_guest_cart_is_merged_at_login(self):
+        self.post("/api/v1/cart", {"product_id": self.ids[0]})
+        token = self.client.post("/api/v1/guest-cart").json()["token"]
+        self.client.post("/api/v1/guest-cart/items:batch", json.dumps([{"product_id": self.ids[0], "quantity": 2}, {"product_id": self.ids[2]}]),
+                         content_type="application/json", HTTP_X_GUEST_CART=token)
+
+        login = {"email": self.user.email, "password": "pw", "guest_cart": token}
+        self.assertEqual(self.client.post("/api/v1/auth/login", json.dumps(login), content_type="application/json").status_code, 200)
+        cart = self.client.get("/api/v1/cart", **self.auth).json()
+        self.assertEqual({item["product"]["id"]: item["quantity"] for item in cart["items"]}, {self.ids[0]: 3, self.ids[2]: 1})
+        self.assertEqual(self.client.get("/api/v1/guest-cart", HTTP_X_GUEST_CART=token).status_code, 404)
@@ -12,10 +12,8 @@ async def get_or_create_open_cart(user):
     return await Cart.objects.acreate(user=user)
 
 
-async def apply_coupon_to_cart(cart: Cart, code: str):
+async def get_valid_coupon(code: str):
     coupon = await sync_to_async(Coupon.objects.filter(code__iexact=code).first)()
     if not coupon or not coupon.is_valid_now:
         return None
-    cart.coupon = coupon
-    await cart.asave()
-    return coupon
\ No newline at end of file
+    return coupon
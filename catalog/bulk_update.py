@@ -0,0 +1,81 @@
+from typing import List
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .schemas import ProductBulkUpdateRow
+from .cache import bump_catalog_version
+from .fragments import invalidate_product_fragments
+
+
+BULK_UPDATE_CHUNK_SIZE = 1000
+
+# `v.<field>` is NULL when the row leaves that field untouched
+BULK_UPDATE_SQL = """
+UPDATE catalog_product AS p
+SET price = COALESCE(v.price, p.price),
+    stock = COALESCE(v.stock, p.stock),
+    is_active = COALESCE(v.is_active, p.is_active),
+    updated_at = %s
+FROM (VALUES {values}) AS v(idx, target, price, stock, is_active)
+WHERE p.{target} = v.target
+RETURNING v.idx, p.id
+"""
+
+VALUES_ROW_SQL = {
+    "id": "(%s::integer, %s::bigint, %s::numeric, %s::integer, %s::boolean)",
+    "slug": "(%s::integer, %s::varchar, %s::numeric, %s::integer, %s::boolean)",
+}
+
+
+def _update_chunk(cursor, target: str, rows: list, now) -> dict:
+    values = ", ".join([VALUES_ROW_SQL[target]] * len(rows))
+    params = [now]
+    for index, row in rows:
+        params += [index, getattr(row, target), row.price, row.stock, row.is_active]
+    cursor.execute(BULK_UPDATE_SQL.format(values=values, target=target), params)
+    return dict(cursor.fetchall())
+
+
+def bulk_update_products(items: List[ProductBulkUpdateRow], chunk_size: int = BULK_UPDATE_CHUNK_SIZE) -> dict:
+    """Apply price/stock/is_active changes with one `UPDATE ... FROM (VALUES ...)` per chunk.
+
+    Rows are applied in a single transaction. A product targeted several times keeps
+    its last row, the earlier ones are reported as `superseded`.
+    """
+    latest = {}
+    for index, row in enumerate(items):
+        target = "id" if row.id is not None else "slug"
+        latest[(target, getattr(row, target))] = index
+
+    chunks = {"id": [], "slug": []}
+    for (target, _), index in latest.items():
+        chunks[target].append((index, items[index]))
+
+    updated = {}
+    now = timezone.now()
+    with transaction.atomic(), connection.cursor() as cursor:
+        for target, rows in chunks.items():
+            for start in range(0, len(rows), chunk_size):
+                updated.update(_update_chunk(cursor, target, rows[start:start + chunk_size], now))
+
+    if updated:
+        # set-based writes fire no signals
+        invalidate_product_fragments(set(updated.values()))
+        bump_catalog_version()
+
+    applied = set(latest.values())
+    results = []
+    for index in range(len(items)):
+        if index not in applied:
+            results.append({"index": index, "id": None, "status": "superseded"})
+        elif index in updated:
+            results.append({"index": index, "id": updated[index], "status": "updated"})
+        else:
+            results.append({"index": index, "id": None, "status": "not_found"})
+
+    return {
+        "updated": len(updated),
+        "not_found": len(applied) - len(updated),
+        "results": results,
+    }
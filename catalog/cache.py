@@ -0,0 +1,187 @@
+import json
+import time
+import hashlib
+from decimal import Decimal
+from functools import wraps
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+
+from pydantic import ValidationError
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+CATALOG_VERSION_KEY = "catalog:version"
+
+
+def new_catalog_version() -> str:
+    # "<unix time in ms>-<random>", the time doubles as the catalog Last-Modified
+    return f"{time.time_ns() // 1_000_000}-{uuid4().hex}"
+
+
+def catalog_version_modified(version: str) -> Optional[float]:
+    try:
+        return int(version.split("-", 1)[0]) / 1000
+    except ValueError:
+        return None
+
+
+def get_catalog_version() -> str:
+    return cache.get_or_set(CATALOG_VERSION_KEY, new_catalog_version(), None)
+
+
+async def aget_catalog_version() -> str:
+    return await cache.aget_or_set(CATALOG_VERSION_KEY, new_catalog_version(), None)
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response at once.
+
+    A random stamp (rather than a counter) is used so that an evicted version key
+    can never come back with a value that matches stale cached pages.
+    Queryset `update()`/`bulk_create()` calls do not fire model signals, so code
+    writing to the catalog that way has to call this itself.
+    """
+    cache.set(CATALOG_VERSION_KEY, new_catalog_version(), None)
+    discard_catalog_snapshot()
+
+
+# `GET /api/v1/<name>` bodies pre-rendered by `catalog.snapshot` and served by nginx
+CATALOG_SNAPSHOT_NAMES = ("products", "categories", "brands")
+
+
+def catalog_snapshot_path(name: str, suffix: str = "") -> Path:
+    return Path(settings.CATALOG_SNAPSHOT_ROOT) / f"{name}.json{suffix}"
+
+
+def discard_catalog_snapshot():
+    # nginx only serves a snapshot while its plain `.json` file exists, so requests
+    # go to Django until `build_catalog_snapshot` renders the new catalog version
+    for name in CATALOG_SNAPSHOT_NAMES:
+        catalog_snapshot_path(name).unlink(missing_ok=True)
+
+
+def _normalize(value):
+    if isinstance(value, Decimal):
+        return str(value.normalize())
+    return value
+
+
+def catalog_cache_key(request, version: str, filter_schema=None, params=None, uncached=None):
+    """Build the cache key of a catalog GET request, or None if it can't be cached.
+
+    Filters are validated through `filter_schema` so that equivalent query strings
+    (`min_price=10` / `min_price=10.00`, different param order, empty params)
+    share one entry. Only the whitelisted `params` (with their defaults) are added,
+    so unrelated query params can't be used to fragment the cache. `uncached` maps
+    params to the values whose results change without a catalog version bump
+    (e.g. the sales-based sorts), requests with one of them aren't cached.
+    """
+    query = {k: v for k, v in request.GET.items() if v != ""}
+    parts = {}
+
+    if filter_schema is not None:
+        try:
+            filters = filter_schema.model_validate(query)
+        except ValidationError:
+            return None
+        parts["filters"] = {
+            name: _normalize(value)
+            for name, value in filters.model_dump(exclude_none=True).items()
+        }
+
+    for name, default in (params or {}).items():
+        value = request.GET.get(name, default)
+        if isinstance(default, int):
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                return None
+        if value in (uncached or {}).get(name, ()):
+            return None
+        parts[name] = value
+
+    digest = hashlib.md5(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return f"catalog:{version}:{request.path}:{digest}"
+
+
+def cache_catalog_response(filter_schema=None, params=None, timeout=None, uncached=None):
+    """Cache the serialized JSON body of a catalog GET operation.
+
+    Meant to be used with `ninja.decorators.decorate_view` so it wraps the whole
+    operation (validation, pagination and serialization). Entries are scoped by the
+    catalog version stamp, which is bumped by `catalog.signals` on every write.
+    """
+    if timeout is None:
+        timeout = settings.CATALOG_CACHE_TIMEOUT
+
+    def decorator(view_func):
+        @wraps(view_func)
+        async def _wrapped_view(request, *args, **kwargs):
+            if request.method != "GET":
+                return await view_func(request, *args, **kwargs)
+
+            version = await aget_catalog_version()
+            key = catalog_cache_key(request, version, filter_schema, params, uncached)
+            if key is None:
+                return await view_func(request, *args, **kwargs)
+
+            content = await cache.aget(key)
+            if content is not None:
+                return HttpResponse(content, content_type="application/json")
+
+            response = await view_func(request, *args, **kwargs)
+            if response.status_code == 200:
+                await cache.aset(key, response.content, timeout)
+            return response
+
+        return _wrapped_view
+
+    return decorator
+
+
+def conditional_catalog_response(filter_schema=None, params=None, uncached=None):
+    """Send `ETag`/`Last-Modified` validators on a catalog GET operation and answer
+    `If-None-Match`/`If-Modified-Since` with a 304 before the view runs.
+
+    Both validators are derived from the catalog version stamp (and, for the ETag,
+    the request's normalized cache key), so checking them costs one cache read and
+    no query. `Last-Modified` only has a one second resolution, clients sending both
+    headers are answered from the ETag. Meant to be used with
+    `ninja.decorators.decorate_view`, outside of `cache_catalog_response`.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        async def _wrapped_view(request, *args, **kwargs):
+            if request.method != "GET":
+                return await view_func(request, *args, **kwargs)
+
+            version = await aget_catalog_version()
+            key = catalog_cache_key(request, version, filter_schema, params, uncached)
+            if key is None:
+                return await view_func(request, *args, **kwargs)
+
+            etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+            last_modified = catalog_version_modified(version)
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified and int(last_modified))
+            if not_modified is not None:
+                not_modified.headers["ETag"] = etag
+                if last_modified:
+                    not_modified.headers["Last-Modified"] = http_date(last_modified)
+                return not_modified
+
+            response = await view_func(request, *args, **kwargs)
+            if response.status_code == 200:
+                response.headers["ETag"] = etag
+                if last_modified:
+                    response.headers["Last-Modified"] = http_date(last_modified)
+            return response
+
+        return _wrapped_view
+
+    return decorator
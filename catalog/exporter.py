@@ -0,0 +1,72 @@
+import io
+import csv
+from typing import AsyncIterator
+
+from .models import Product
+from .fragments import dumps
+
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+EXPORT_CHUNK_SIZE = 2000
+
+# the first columns are the ones `catalog.importer` reads, so an export can be imported back
+EXPORT_FIELDS = [
+    "name", "slug", "description", "price", "stock", "is_active", "category", "brand",
+    "id", "cover_image", "rating_count", "average_rating", "created_at", "updated_at",
+]
+
+
+def export_queryset():
+    # brand and category names come from the join, there are no per-row lookups
+    return Product.objects.order_by("id").values(
+        *[field for field in EXPORT_FIELDS if field not in ("category", "brand")],
+        "category__name", "brand__name",
+    )
+
+
+def export_row(row: dict, storage) -> dict:
+    row["category"] = row.pop("category__name")
+    row["brand"] = row.pop("brand__name")
+    row["cover_image"] = storage.url(row["cover_image"]) if row["cover_image"] else None
+    return {field: row[field] for field in EXPORT_FIELDS}
+
+
+async def export_products(format: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Stream the whole catalog as NDJSON or CSV, one chunk of rows per yielded block.
+
+    Rows are read through a server-side cursor, so memory use depends on
+    `chunk_size` and not on the size of the catalog.
+    """
+    storage = Product._meta.get_field("cover_image").storage
+    buffer = io.StringIO()
+    writer = None
+    if format == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+
+    lines = []
+    count = 0
+    async for row in export_queryset().aiterator(chunk_size=chunk_size):
+        row = export_row(row, storage)
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            lines.append(dumps(row) + b"\n")
+        count += 1
+        if count % chunk_size == 0:
+            yield _flush(buffer, lines)
+
+    if block := _flush(buffer, lines):
+        yield block
+
+
+def _flush(buffer: io.StringIO, lines: list) -> bytes:
+    block = b"".join(lines) or buffer.getvalue().encode()
+    lines.clear()
+    buffer.seek(0)
+    buffer.truncate()
+    return block
@@ -0,0 +1,109 @@
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, F, Case, When, Value, BooleanField, IntegerField, ExpressionWrapper
+
+from .models import Product
+from .filter_schemas import ProductFilterSchema
+
+
+# facet dimension -> the ProductFilterSchema fields that filter on it
+FACET_FIELDS = {
+    'brands': ('brand_id',),
+    'categories': ('category_id',),
+    'price_bands': ('min_price', 'max_price'),
+    'availability': ('in_stock',),
+}
+
+FACETS_SQL = """
+SELECT
+    CASE
+        WHEN GROUPING(brand_id, brand_name) = 0 THEN 'brands'
+        WHEN GROUPING(category_id, category_name) = 0 THEN 'categories'
+        WHEN GROUPING(price_band) = 0 THEN 'price_bands'
+        ELSE 'availability'
+    END AS facet,
+    COALESCE(brand_id, category_id, price_band) AS value_id,
+    COALESCE(brand_name, category_name) AS value_name,
+    in_stock,
+    CASE
+        WHEN GROUPING(brand_id, brand_name) = 0 THEN COUNT(*) FILTER (WHERE match_brands)
+        WHEN GROUPING(category_id, category_name) = 0 THEN COUNT(*) FILTER (WHERE match_categories)
+        WHEN GROUPING(price_band) = 0 THEN COUNT(*) FILTER (WHERE match_price_bands)
+        ELSE COUNT(*) FILTER (WHERE match_availability)
+    END AS count
+FROM ({products}) AS products
+GROUP BY GROUPING SETS ((brand_id, brand_name), (category_id, category_name), (price_band), (in_stock))
+"""
+
+
+def _filter_expression(filters: ProductFilterSchema, excluded_fields) -> Q:
+    return filters.model_copy(update=dict.fromkeys(excluded_fields)).get_filter_expression()
+
+
+def _match(filters: ProductFilterSchema, excluded_fields) -> ExpressionWrapper | Value:
+    q = _filter_expression(filters, excluded_fields)
+    return ExpressionWrapper(q, output_field=BooleanField()) if q else Value(True)
+
+
+def _price_band(edges) -> Case:
+    return Case(
+        *[When(price__gte=edge, then=Value(i)) for i, edge in reversed(list(enumerate(edges)))],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def get_product_facets(filters: ProductFilterSchema) -> dict:
+    """Count active products per brand, category, price band and availability in one query.
+
+    Each dimension is counted with every filter applied except its own (so picking a
+    brand still shows how many products the other brands have). Filters that are not
+    a facet dimension, like `q` and `min_rating`, narrow all the counts.
+    """
+    edges = settings.CATALOG_PRICE_BANDS
+    facet_fields = [field for fields in FACET_FIELDS.values() for field in fields]
+
+    qs = Product.objects.filter(is_active=True) \
+                        .filter(_filter_expression(filters, facet_fields)) \
+                        .annotate(
+                            brand_name=F('brand__name'),
+                            category_name=F('category__name'),
+                            price_band=_price_band(edges),
+                            in_stock=ExpressionWrapper(Q(stock__gt=0), output_field=BooleanField()),
+                            **{f"match_{facet}": _match(filters, fields) for facet, fields in FACET_FIELDS.items()},
+                        ) \
+                        .order_by() \
+                        .values('brand_id', 'brand_name', 'category_id', 'category_name', 'price_band', 'in_stock',
+                                *[f"match_{facet}" for facet in FACET_FIELDS])
+    sql, params = qs.query.sql_with_params()
+
+    facets = {'brands': [], 'categories': [], 'price_bands': [], 'availability': {'in_stock': 0, 'out_of_stock': 0}}
+    with connection.cursor() as cursor:
+        cursor.execute(FACETS_SQL.format(products=sql), params)
+        rows = cursor.fetchall()
+
+    for facet, value_id, value_name, in_stock, count in rows:
+        if not count:
+            continue
+        if facet == 'availability':
+            facets[facet]['in_stock' if in_stock else 'out_of_stock'] = count
+        elif facet == 'price_bands':
+            facets[facet].append({
+                'min_price': Decimal(edges[value_id]),
+                'max_price': Decimal(edges[value_id + 1]) if value_id + 1 < len(edges) else None,
+                'count': count,
+            })
+        elif value_id is not None:
+            facets[facet].append({'id': value_id, 'name': value_name, 'count': count})
+
+    facets['brands'].sort(key=lambda facet: (-facet['count'], facet['name']))
+    facets['categories'].sort(key=lambda facet: (-facet['count'], facet['name']))
+    facets['price_bands'].sort(key=lambda facet: facet['min_price'])
+    return facets
+
+
+async def aget_product_facets(filters: ProductFilterSchema) -> dict:
+    return await sync_to_async(get_product_facets)(filters)
@@ -1,14 +1,52 @@
 from ninja import FilterSchema, Field
-from typing import Optional
+from typing import Literal, Optional
 from decimal import Decimal
 
 from django.db.models import Q
+from django.contrib.postgres.search import SearchQuery
+
+from .models import SEARCH_CONFIG, RATING_SORT_EXPRESSION
+
+
+ProductSort = Literal["newest", "price_asc", "price_desc", "name", "rating", "best_selling", "popular"]
+
+# `sort` -> listing ordering, the id tiebreaker keeps keyset cursors stable. Each one
+# is served by a `listing_indexes()` index, also when filtered by category or brand.
+PRODUCT_SORTS = {
+    "newest": ["-created_at", "-id"],
+    "price_asc": ["price", "id"],
+    "price_desc": ["-price", "-id"],
+    "name": ["name", "id"],
+    "rating": ["-rating", "-id"],
+    "best_selling": ["-sales_count", "-id"],
+    # all-time units sold, updated as orders get paid; time-windowed ranks are served by `GET /products/trending`
+    "popular": ["-sales_count", "-id"],
+}
+
+# sorts by `Product.sales_count`, which the order status trigger updates without bumping the
+# catalog version, so these listings are left out of the catalog response cache and ETags
+SALES_SORTS = ("best_selling", "popular")
+
+# sort keys that aren't columns, annotated under their name (same expressions as the indexes)
+PRODUCT_SORT_ANNOTATIONS = {
+    "rating": RATING_SORT_EXPRESSION,
+}
+
+
+def product_search_query(value: str) -> SearchQuery:
+    return SearchQuery(value, config=SEARCH_CONFIG, search_type='websearch')
+
 
 class ProductFilterSchema(FilterSchema):
+    q: Optional[str] = Field(None, description="Full-text search over name, brand, category and description")
     category_id: Optional[int] = Field(None, alias="category")
     brand_id: Optional[int] = Field(None, alias="brand")
     min_price: Optional[Decimal] = Field(None, q='price__gte')
     max_price: Optional[Decimal] = Field(None, q='price__lte')
+    min_rating: Optional[float] = Field(None, q='average_rating__gte')
     in_stock: Optional[bool] = Field(None)
+    def filter_q(self, value: str) -> Q:
+        return Q(search_vector=product_search_query(value)) if value else Q()
+
     def filter_in_stock(self, value: bool) -> Q:
         return Q(stock__gt=0) if value else Q(stock=0)
\ No newline at end of file
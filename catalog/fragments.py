@@ -0,0 +1,163 @@
+import json
+from typing import FrozenSet, Iterable, List, Optional
+from uuid import uuid4
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef
+from django.contrib.postgres.expressions import ArraySubquery
+from django.http import HttpResponse
+from ninja.responses import NinjaJSONEncoder
+
+from .models import Product, ProductImage
+from .schemas import ProductOut, ProductListOut, CategoryOut, BrandOut, ProductImageOut
+
+
+# fragment variant -> schema whose fields (in order) it renders, output matches `schema.from_orm(product)`
+FRAGMENT_SCHEMAS = {
+    "list": ProductListOut,
+    "detail": ProductOut,
+}
+
+# relations of the product schemas, a sparse fieldset only queries the selected ones
+PRODUCT_RELATIONS = {
+    "category": CategoryOut,
+    "brand": BrandOut,
+    "images": ProductImageOut,
+}
+
+# `.values()` columns holding file names, rendered as urls like ninja does for `FieldFile`s
+PRODUCT_FILE_COLUMNS = ("cover_image", "brand__image")
+
+
+def product_version_key(product_id: int) -> str:
+    return f"catalog:product:{product_id}:version"
+
+
+def product_fragment_key(product_id: int, version: str, variant: str) -> str:
+    return f"catalog:product:{product_id}:{version}:{variant}"
+
+
+def dumps(data) -> bytes:
+    # same encoder as ninja's JSONRenderer, so cached fragments match a regular response byte for byte
+    return json.dumps(data, cls=NinjaJSONEncoder).encode()
+
+
+def invalidate_product_fragments(product_ids: Iterable[int]):
+    """Drop the fragments of the given products.
+
+    Deleting the version key (instead of the fragments themselves) is enough: the
+    next read stamps a new version, so fragments rendered under the old one are
+    never looked up again and simply expire. Queryset `update()` calls do not fire
+    model signals, so code writing to products that way has to call this itself.
+    """
+    cache.delete_many([product_version_key(product_id) for product_id in product_ids])
+
+
+def product_fields(variant: str) -> List[str]:
+    """Field names of a fragment variant, the ones a sparse fieldset can select."""
+    return list(FRAGMENT_SCHEMAS[variant].model_fields)
+
+
+def render_product_fragments(product_ids: List[int], variant: str, selected: Optional[FrozenSet[str]] = None) -> dict:
+    """Serialize products straight from `.values()` rows, no model is instantiated.
+
+    Plain fields, category and brand come from a single query that only selects
+    (and joins) the `selected` fields, all of them by default. Images are gathered
+    into an array by a subquery of that same query.
+    """
+    fields = [name for name in product_fields(variant) if selected is None or name in selected]
+    columns = {"id"}
+    for name in fields:
+        if name in ("category", "brand"):
+            columns.update(f"{name}__{field}" for field in PRODUCT_RELATIONS[name].model_fields)
+        elif name != "images":
+            columns.add(name)
+
+    qs = Product.objects.filter(id__in=product_ids)
+    if "images" in fields:
+        images = ProductImage.objects.filter(product=OuterRef("pk")).order_by("id").values("image")
+        qs = qs.annotate(image_names=ArraySubquery(images))
+        columns.add("image_names")
+
+    storage = Product._meta.get_field("cover_image").storage
+    fragments = {}
+    for row in qs.values(*columns):
+        for column in PRODUCT_FILE_COLUMNS:
+            if column in row:
+                row[column] = storage.url(row[column]) if row[column] else None
+        data = {}
+        for name in fields:
+            if name == "images":
+                data[name] = [{"image": storage.url(image) if image else None} for image in row["image_names"]]
+            elif name in ("category", "brand"):
+                related = {field: row[f"{name}__{field}"] for field in PRODUCT_RELATIONS[name].model_fields}
+                data[name] = related if related["id"] is not None else None
+            else:
+                data[name] = row[name]
+        fragments[row["id"]] = dumps(data)
+    return fragments
+
+
+async def aget_product_fragments(product_ids: List[int], variant: str, selected: Optional[FrozenSet[str]] = None) -> dict:
+    """Serialized JSON of the given products by id, rendered only for cache misses.
+
+    Products that no longer exist are left out. With `selected` (a resolved
+    `FieldsetQuery`) only those fields are rendered, straight from the database:
+    sparse fragments are not cached, the responses embedding them are.
+    """
+    if not product_ids:
+        return {}
+    if selected is not None:
+        return await sync_to_async(render_product_fragments)(product_ids, variant, selected)
+    timeout = settings.CATALOG_CACHE_TIMEOUT
+
+    version_keys = {product_id: product_version_key(product_id) for product_id in product_ids}
+    versions = await cache.aget_many(version_keys.values())
+    new_versions = {key: uuid4().hex for key in version_keys.values() if key not in versions}
+    if new_versions:
+        await cache.aset_many(new_versions, timeout)
+        versions.update(new_versions)
+
+    fragment_keys = {
+        product_id: product_fragment_key(product_id, versions[key], variant)
+        for product_id, key in version_keys.items()
+    }
+    cached = await cache.aget_many(fragment_keys.values())
+    fragments = {product_id: cached[key] for product_id, key in fragment_keys.items() if key in cached}
+
+    missing = [product_id for product_id in fragment_keys if product_id not in fragments]
+    if missing:
+        rendered = await sync_to_async(render_product_fragments)(missing, variant)
+        await cache.aset_many({fragment_keys[product_id]: fragment for product_id, fragment in rendered.items()}, timeout)
+        fragments.update(rendered)
+
+    return fragments
+
+
+def assemble(data: dict) -> bytes:
+    """`dumps` for a dict whose `bytes` values are already serialized JSON."""
+    return b"{" + b", ".join(
+        dumps(key) + b": " + (value if isinstance(value, bytes) else dumps(value))
+        for key, value in data.items()
+    ) + b"}"
+
+
+def assemble_list(fragments: Iterable[bytes]) -> bytes:
+    return b"[" + b", ".join(fragments) + b"]"
+
+
+def json_response(content: bytes) -> HttpResponse:
+    return HttpResponse(content, content_type="application/json")
+
+
+async def aproduct_page_response(page: dict, variant: str = "list", selected: Optional[FrozenSet[str]] = None) -> HttpResponse:
+    """Render a `KeysetPagination` page of product `.values()` rows from their fragments."""
+    product_ids = [row["id"] for row in page["items"]]
+    fragments = await aget_product_fragments(product_ids, variant, selected)
+    return json_response(assemble({
+        "items": assemble_list(fragments[product_id] for product_id in product_ids if product_id in fragments),
+        "count": page["count"],
+        "next_cursor": page.get("next_cursor"),
+    }))
@@ -0,0 +1,183 @@
+import io
+import csv
+import json
+from functools import reduce
+from itertools import islice
+from operator import or_
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from django.db import transaction, DatabaseError
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .models import Product, Category, Brand
+from .schemas import ProductImportRow
+from .cache import bump_catalog_version
+from .fragments import invalidate_product_fragments
+
+
+IMPORT_FORMATS = ("ndjson", "csv")
+
+IMPORT_CHUNK_SIZE = 1000
+
+# product fields overwritten when an imported slug already exists
+UPSERT_FIELDS = ["name", "description", "price", "stock", "is_active", "category", "brand", "updated_at"]
+
+
+def import_format(filename: str) -> Optional[str]:
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension == "csv":
+        return "csv"
+    if extension in ("ndjson", "jsonl", "json"):
+        return "ndjson"
+    return None
+
+
+def read_rows(stream: BinaryIO, format: str) -> Iterator[Tuple[int, object]]:
+    """Yield `(row number, raw row)` from an upload, the raw row is an exception when unparsable."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if format == "csv":
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            # empty cells mean "not provided", like a missing NDJSON key
+            yield number, {key: value for key, value in row.items() if key and value not in ("", None)}
+        return
+
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            yield number, json.loads(line)
+        except ValueError as exc:
+            yield number, exc
+
+
+def _chunks(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _resolve_names(model, names: set) -> dict:
+    """Map names to ids, creating the missing rows with a single insert."""
+    if not names:
+        return {}
+    existing = dict(model.objects.filter(name__in=names).values_list("name", "id"))
+    missing = names - existing.keys()
+    if missing:
+        # bulk_create skips save(), which is what sets the slug
+        model.objects.bulk_create([model(name=name, slug=slugify(name)) for name in missing], ignore_conflicts=True)
+        existing.update(model.objects.filter(name__in=missing).values_list("name", "id"))
+    return existing
+
+
+def _taken_slugs(bases: set, slugs: set) -> set:
+    """Existing slugs among `slugs` and those `Product.save` could derive from `bases`, in one query."""
+    conditions = [Q(slug__in=slugs)] if slugs else []
+    conditions += [Q(slug=base) | Q(slug__startswith=f"{base}-") for base in bases]
+    if not conditions:
+        return set()
+    return set(Product.objects.filter(reduce(or_, conditions)).values_list("slug", flat=True))
+
+
+def import_chunk(rows: List[Tuple[int, object]], result: dict):
+    products = {}  # slug -> (row number, product), a slug repeated in the chunk keeps its last row
+    valid = []
+    for number, raw in rows:
+        try:
+            if isinstance(raw, Exception):
+                raise ValueError(f"Invalid JSON: {raw}")
+            if not isinstance(raw, dict):
+                raise ValueError("Row must be an object")
+            valid.append((number, ProductImportRow.model_validate(raw)))
+        except ValidationError as exc:
+            _fail(result, number, [f"{'.'.join(map(str, error['loc'])) or 'row'}: {error['msg']}" for error in exc.errors()])
+        except ValueError as exc:
+            _fail(result, number, [str(exc)])
+    if not valid:
+        return
+
+    categories = _resolve_names(Category, {row.category for _, row in valid if row.category})
+    brands = _resolve_names(Brand, {row.brand for _, row in valid if row.brand})
+
+    explicit = {row.slug for _, row in valid if row.slug}
+    bases = {slugify(row.name) or "product" for _, row in valid if not row.slug}
+    existing = _taken_slugs(bases, explicit)
+    taken = existing | explicit
+
+    for number, row in valid:
+        if row.category and row.category not in categories:
+            _fail(result, number, [f"category: could not create {row.category!r}"])
+            continue
+        if row.brand and row.brand not in brands:
+            _fail(result, number, [f"brand: could not create {row.brand!r}"])
+            continue
+
+        slug = row.slug
+        if not slug:
+            # same scheme as Product.save, but against the slugs fetched for the whole chunk
+            base = slug = slugify(row.name) or "product"
+            i = 1
+            while slug in taken:
+                slug = f"{base}-{i}"
+                i += 1
+            taken.add(slug)
+        elif slug in products:
+            _fail(result, products[slug][0], [f"slug: superseded by row {number}"])
+
+        products[slug] = (number, Product(
+            name=row.name,
+            slug=slug,
+            description=row.description or "",
+            price=row.price,
+            stock=row.stock,
+            is_active=row.is_active,
+            category_id=categories.get(row.category),
+            brand_id=brands.get(row.brand),
+        ))
+
+    try:
+        with transaction.atomic():
+            created = Product.objects.bulk_create(
+                [product for _, product in products.values()],
+                update_conflicts=True,
+                unique_fields=["slug"],
+                update_fields=UPSERT_FIELDS,
+            )
+    except DatabaseError as exc:
+        for number, _ in products.values():
+            _fail(result, number, [f"chunk failed: {exc}"])
+        return
+
+    updated = len(existing & products.keys())
+    result["updated"] += updated
+    result["created"] += len(created) - updated
+    invalidate_product_fragments([product.pk for product in created])
+
+
+def _fail(result: dict, number: int, errors: List[str]):
+    result["failed"] += 1
+    if result["max_errors"] is None or len(result["errors"]) < result["max_errors"]:
+        result["errors"].append({"row": number, "errors": errors})
+
+
+def import_products(rows: Iterable[Tuple[int, object]], chunk_size: int = IMPORT_CHUNK_SIZE, max_errors: Optional[int] = None) -> dict:
+    """Create or update products from `read_rows` output, `chunk_size` rows per transaction.
+
+    Each chunk costs a handful of queries whatever its size: one lookup (and at most
+    one insert) for its categories and brands, one for the slugs it may collide with,
+    and a single `INSERT ... ON CONFLICT (slug) DO UPDATE`. Invalid rows are reported
+    in `errors` (up to `max_errors`) and never stop the import.
+    """
+    result = {"created": 0, "updated": 0, "failed": 0, "errors": [], "max_errors": max_errors}
+    try:
+        for chunk in _chunks(rows, chunk_size):
+            import_chunk(chunk, result)
+    finally:
+        # bulk writes fire no signals
+        bump_catalog_version()
+    del result["max_errors"]
+    result["errors"].sort(key=lambda error: error["row"])
+    return result
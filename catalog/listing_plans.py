@@ -0,0 +1,46 @@
+import json
+
+from django.conf import settings
+from django.db import connection
+
+from .filter_schemas import ProductFilterSchema
+from .routers_products import product_list_values
+
+
+# one case per `ProductFilterSchema` filter, `q` is left out: relevance (or any sort
+# of the matches) is computed per query and always ends with a (top-N) sort
+FILTER_CASES = {
+    "unfiltered": {},
+    "category": {"category": 1},
+    "brand": {"brand": 1},
+    "price range": {"min_price": "10", "max_price": "100"},
+    "min rating": {"min_rating": 3},
+    "in stock": {"in_stock": True},
+    "category + price range": {"category": 1, "min_price": "10", "max_price": "100"},
+}
+
+# plan nodes that read (and order) every matching row instead of the first page of an index
+OFFENDING_NODES = ("Sort", "Incremental Sort", "Seq Scan")
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def disable_sorts_and_seqscans():
+    """Make the planner pick an index whenever one can serve the listing, until the transaction ends.
+
+    Small tables are otherwise scanned and sorted, which says nothing about the indexes.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("SET LOCAL enable_sort = off")
+
+
+def listing_plan(sort: str, params: dict) -> list:
+    """Nodes of the plan of the first `GET /products` page for a sort and filter params."""
+    qs = product_list_values(ProductFilterSchema.model_validate(params), sort)
+    plan = qs[:settings.NINJA_PAGINATION_PER_PAGE + 1].explain(format="json")
+    return list(plan_nodes(json.loads(plan)[0]["Plan"]))
@@ -0,0 +1,63 @@
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from catalog.models import Product
+from catalog.fragments import FRAGMENT_SCHEMAS, dumps, render_product_fragments
+
+
+def render_from_models(product_ids, variant):
+    """The model based renderer `render_product_fragments` replaced, kept as the baseline."""
+    schema = FRAGMENT_SCHEMAS[variant]
+    qs = Product.objects.filter(id__in=product_ids).select_related("category", "brand").prefetch_related("images")
+    return {product.id: dumps(schema.from_orm(product).model_dump()) for product in qs}
+
+
+class Command(BaseCommand):
+    help = "Compare rendering product fragments from `.values()` rows against rendering them from model instances."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=20, help="products per render, a listing page by default")
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--variant", choices=list(FRAGMENT_SCHEMAS), default="list")
+
+    def handle(self, *args, products, repeat, variant, **options):
+        product_ids = list(Product.objects.filter(is_active=True).order_by("-created_at").values_list("id", flat=True)[:products])
+        if not product_ids:
+            raise CommandError("No products to render")
+
+        renderers = {
+            "models": lambda: render_from_models(product_ids, variant),
+            "values": lambda: render_product_fragments(product_ids, variant),
+        }
+        outputs = {}
+        for name, render in renderers.items():
+            with CaptureQueriesContext(connection) as queries:
+                outputs[name] = render()
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                render()
+            elapsed = (time.perf_counter() - start) / repeat
+
+            tracemalloc.start()
+            render()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.stdout.write(
+                f"{name:>6}: {elapsed * 1000:8.2f} ms/render  {len(queries):2d} queries  "
+                f"{peak / len(product_ids) / 1024:8.1f} KiB peak/product"
+            )
+
+        mismatched = [
+            product_id for product_id in product_ids
+            if json.loads(outputs["models"][product_id]) != json.loads(outputs["values"][product_id])
+        ]
+        if mismatched:
+            raise CommandError(f"Renderers disagree on products {mismatched}")
+        self.stdout.write(self.style.SUCCESS(f"Same output for {len(product_ids)} products ({variant})"))
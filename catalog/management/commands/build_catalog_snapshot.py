@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from catalog.snapshot import build_catalog_snapshot, watch_catalog_snapshot
+
+
+class Command(BaseCommand):
+    help = "Render the unfiltered product, category and brand listings into static files served by nginx."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--watch", action="store_true", help="keep running and rebuild after catalog writes")
+        parser.add_argument("--interval", type=float, default=settings.CATALOG_SNAPSHOT_DEBOUNCE_SECONDS)
+
+    def handle(self, *args, watch, interval, **options):
+        if watch:
+            watch_catalog_snapshot(interval, settings.CATALOG_CACHE_TIMEOUT, self.stdout, self.stderr)
+        else:
+            version = build_catalog_snapshot()
+            self.stdout.write(self.style.SUCCESS(f"Built catalog snapshot for version {version} in {settings.CATALOG_SNAPSHOT_ROOT}"))
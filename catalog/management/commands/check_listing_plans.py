@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog.filter_schemas import PRODUCT_SORTS
+from catalog.listing_plans import FILTER_CASES, OFFENDING_NODES, disable_sorts_and_seqscans, listing_plan
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN every `GET /products` filter/sort combination and fail if one needs a sort or a sequential scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--as-planned", action="store_true",
+            help="keep the planner settings; by default sorts and sequential scans are disabled, so small "
+                 "tables still show whether an index can serve the listing",
+        )
+
+    def handle(self, *args, as_planned, **options):
+        failures = 0
+        with transaction.atomic():
+            if not as_planned:
+                disable_sorts_and_seqscans()
+
+            for sort in PRODUCT_SORTS:
+                for case, params in FILTER_CASES.items():
+                    nodes = listing_plan(sort, params)
+                    problems = [node["Node Type"] for node in nodes if node["Node Type"] in OFFENDING_NODES]
+                    indexes = sorted({node["Index Name"] for node in nodes if "Index Name" in node})
+                    if problems:
+                        failures += 1
+                        self.stdout.write(self.style.ERROR(f"{sort:>12} / {case}: {', '.join(problems)}"))
+                    else:
+                        self.stdout.write(f"{sort:>12} / {case}: {', '.join(indexes)}")
+
+        if failures:
+            raise CommandError(f"{failures} listing plans need a sort or a sequential scan")
+        self.stdout.write(self.style.SUCCESS("Every listing is served by an index scan without a sort"))
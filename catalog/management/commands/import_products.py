@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import IMPORT_FORMATS, IMPORT_CHUNK_SIZE, import_format, read_rows, import_products
+
+
+class Command(BaseCommand):
+    help = "Create or update products from an NDJSON or CSV file, upserting rows that carry a slug."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=IMPORT_FORMATS, help="defaults to the file extension")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, path, format, chunk_size, **options):
+        format = format or import_format(path)
+        if format is None:
+            raise CommandError("Can't tell the file format from its extension, pass --format")
+
+        with open(path, "rb") as stream:
+            result = import_products(read_rows(stream, format), chunk_size=chunk_size)
+
+        for error in result["errors"]:
+            self.stderr.write(f"row {error['row']}: {'; '.join(error['errors'])}")
+        style = self.style.WARNING if result["failed"] else self.style.SUCCESS
+        self.stdout.write(style(f"Created {result['created']}, updated {result['updated']}, failed {result['failed']} product(s)."))
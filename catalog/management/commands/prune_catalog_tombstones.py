@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from catalog.models import CatalogTombstone
+
+
+class Command(BaseCommand):
+    help = "Delete catalog tombstones older than CATALOG_SYNC_TOMBSTONE_RETENTION_DAYS (sync tokens that old are rejected anyway)."
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.CATALOG_SYNC_TOMBSTONE_RETENTION_DAYS)
+        deleted, _ = CatalogTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstone(s)."))
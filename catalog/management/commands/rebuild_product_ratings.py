@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from catalog.models import RATING_MIN, RATING_MAX
+from catalog.cache import bump_catalog_version
+from catalog.fragments import invalidate_product_fragments
+
+
+HISTOGRAM_SQL = ", ".join(f"COUNT(r.id) FILTER (WHERE r.rating = {i})" for i in range(RATING_MIN, RATING_MAX + 1))
+
+REBUILD_SQL = f"""
+WITH aggregates AS (
+    SELECT p.id AS product_id, COUNT(r.id) AS rating_count, COALESCE(SUM(r.rating), 0) AS rating_sum,
+           ARRAY[{HISTOGRAM_SQL}]::integer[] AS rating_histogram
+    FROM catalog_product AS p
+    LEFT JOIN catalog_productrating AS r ON r.product_id = p.id
+    GROUP BY p.id
+)
+UPDATE catalog_product AS p
+SET rating_count = aggregates.rating_count,
+    rating_sum = aggregates.rating_sum,
+    rating_histogram = aggregates.rating_histogram
+FROM aggregates
+WHERE aggregates.product_id = p.id
+  AND (p.rating_count, p.rating_sum, p.rating_histogram)
+      IS DISTINCT FROM (aggregates.rating_count, aggregates.rating_sum, aggregates.rating_histogram)
+RETURNING p.id;
+"""
+
+
+class Command(BaseCommand):
+    help = "Recompute the rating count, sum and histogram of every product from its ratings."
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), connection.cursor() as cursor:
+            # block rating writes so no trigger delta lands between the scan and the update
+            cursor.execute("LOCK TABLE catalog_productrating IN SHARE MODE")
+            cursor.execute(REBUILD_SQL)
+            fixed = [product_id for product_id, in cursor.fetchall()]
+
+        if fixed:
+            # a raw UPDATE fires no model signals, the cached fragments still hold the old ratings
+            invalidate_product_fragments(fixed)
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates, {len(fixed)} product(s) were out of date."))
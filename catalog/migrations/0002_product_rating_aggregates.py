@@ -0,0 +1,111 @@
+# Generated by Django 5.2 on 2026-10-17 18:09
+
+import catalog.models
+import django.contrib.postgres.fields
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+HISTOGRAM_SQL = ", ".join(f"COUNT(*) FILTER (WHERE rating = {i})" for i in range(11))
+
+BACKFILL_SQL = rf"""
+WITH aggregates AS (
+    SELECT product_id, COUNT(*) AS rating_count, SUM(rating) AS rating_sum, ARRAY[{HISTOGRAM_SQL}]::integer[] AS rating_histogram
+    FROM catalog_productrating
+    GROUP BY product_id
+)
+UPDATE catalog_product AS p
+SET rating_count = aggregates.rating_count,
+    rating_sum = aggregates.rating_sum,
+    rating_histogram = aggregates.rating_histogram
+FROM aggregates
+WHERE aggregates.product_id = p.id;
+"""
+
+
+CREATE_FUNCTION_SQL = r"""
+-- Function: apply the delta of a rating row to its product aggregates
+CREATE OR REPLACE FUNCTION catalog_update_product_rating_aggregates()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE catalog_product
+        SET rating_count = rating_count - 1,
+            rating_sum = rating_sum - OLD.rating,
+            rating_histogram[OLD.rating + 1] = rating_histogram[OLD.rating + 1] - 1
+        WHERE id = OLD.product_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE catalog_product
+        SET rating_count = rating_count + 1,
+            rating_sum = rating_sum + NEW.rating,
+            rating_histogram[NEW.rating + 1] = rating_histogram[NEW.rating + 1] + 1
+        WHERE id = NEW.product_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+CREATE_TRIGGER_SQL = r"""
+-- Trigger on catalog_productrating AFTER INSERT OR UPDATE OR DELETE
+DROP TRIGGER IF EXISTS trg_catalog_update_product_rating_aggregates ON catalog_productrating;
+CREATE TRIGGER trg_catalog_update_product_rating_aggregates
+AFTER INSERT OR UPDATE OF product_id, rating OR DELETE ON catalog_productrating
+FOR EACH ROW
+EXECUTE FUNCTION catalog_update_product_rating_aggregates();
+"""
+
+
+DROP_TRIGGER_SQL = r"""
+DROP TRIGGER IF EXISTS trg_catalog_update_product_rating_aggregates ON catalog_productrating;
+"""
+
+
+DROP_FUNCTION_SQL = r"""
+DROP FUNCTION IF EXISTS catalog_update_product_rating_aggregates();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_histogram',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.PositiveIntegerField(), default=catalog.models.empty_rating_histogram, editable=False, size=11),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='average_rating',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('rating_sum'), models.FloatField()), '/', django.db.models.functions.comparison.NullIf(models.F('rating_count'), 0)), output_field=models.FloatField()),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['average_rating'], name='catalog_pro_average_1ec8e4_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productrating',
+            constraint=models.CheckConstraint(condition=models.Q(('rating__gte', 0), ('rating__lte', 10)), name='rating_between_min_and_max'),
+        ),
+        migrations.RunSQL(
+            sql=BACKFILL_SQL + CREATE_FUNCTION_SQL + CREATE_TRIGGER_SQL,
+            reverse_sql=DROP_TRIGGER_SQL + DROP_FUNCTION_SQL,
+        ),
+    ]
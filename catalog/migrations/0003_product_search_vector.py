@@ -0,0 +1,97 @@
+# Generated by Django 5.2 on 2026-10-17 18:13
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+CREATE_FUNCTIONS_SQL = r"""
+-- Function: compute the weighted search document of a product row
+CREATE OR REPLACE FUNCTION catalog_update_product_search_vector()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce((SELECT name FROM catalog_brand WHERE id = NEW.brand_id), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce((SELECT name FROM catalog_category WHERE id = NEW.category_id), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+-- Function: refresh the search document of products when their brand or category is renamed
+CREATE OR REPLACE FUNCTION catalog_refresh_related_product_search_vector()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'catalog_brand' THEN
+        UPDATE catalog_product SET name = name WHERE brand_id = NEW.id;
+    ELSE
+        UPDATE catalog_product SET name = name WHERE category_id = NEW.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+CREATE_TRIGGERS_SQL = r"""
+-- Trigger on catalog_product BEFORE INSERT OR UPDATE
+DROP TRIGGER IF EXISTS trg_catalog_update_product_search_vector ON catalog_product;
+CREATE TRIGGER trg_catalog_update_product_search_vector
+BEFORE INSERT OR UPDATE OF name, description, brand_id, category_id ON catalog_product
+FOR EACH ROW
+EXECUTE FUNCTION catalog_update_product_search_vector();
+
+-- Triggers on catalog_brand / catalog_category AFTER UPDATE OF name
+DROP TRIGGER IF EXISTS trg_catalog_refresh_brand_product_search_vector ON catalog_brand;
+CREATE TRIGGER trg_catalog_refresh_brand_product_search_vector
+AFTER UPDATE OF name ON catalog_brand
+FOR EACH ROW
+WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION catalog_refresh_related_product_search_vector();
+
+DROP TRIGGER IF EXISTS trg_catalog_refresh_category_product_search_vector ON catalog_category;
+CREATE TRIGGER trg_catalog_refresh_category_product_search_vector
+AFTER UPDATE OF name ON catalog_category
+FOR EACH ROW
+WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION catalog_refresh_related_product_search_vector();
+
+-- Backfill existing products
+UPDATE catalog_product SET name = name;
+"""
+
+
+DROP_TRIGGERS_SQL = r"""
+DROP TRIGGER IF EXISTS trg_catalog_refresh_category_product_search_vector ON catalog_category;
+DROP TRIGGER IF EXISTS trg_catalog_refresh_brand_product_search_vector ON catalog_brand;
+DROP TRIGGER IF EXISTS trg_catalog_update_product_search_vector ON catalog_product;
+"""
+
+
+DROP_FUNCTIONS_SQL = r"""
+DROP FUNCTION IF EXISTS catalog_refresh_related_product_search_vector();
+DROP FUNCTION IF EXISTS catalog_update_product_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='catalog_pro_search__6e8905_gin'),
+        ),
+        migrations.RunSQL(
+            sql=CREATE_FUNCTIONS_SQL + CREATE_TRIGGERS_SQL,
+            reverse_sql=DROP_TRIGGERS_SQL + DROP_FUNCTIONS_SQL,
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2 on 2026-10-17 18:28
+
+from django.db import migrations, models
+
+
+# rating changes alter the product representation, so they now bump `updated_at` too
+# (the delta sync in `GET /products/changes` is driven by it)
+RATING_FUNCTION_SQL = r"""
+CREATE OR REPLACE FUNCTION catalog_update_product_rating_aggregates()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE catalog_product
+        SET rating_count = rating_count - 1,
+            rating_sum = rating_sum - OLD.rating,
+            rating_histogram[OLD.rating + 1] = rating_histogram[OLD.rating + 1] - 1{updated_at}
+        WHERE id = OLD.product_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE catalog_product
+        SET rating_count = rating_count + 1,
+            rating_sum = rating_sum + NEW.rating,
+            rating_histogram[NEW.rating + 1] = rating_histogram[NEW.rating + 1] + 1{updated_at}
+        WHERE id = NEW.product_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_name_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('product', 'Product'), ('brand', 'Brand'), ('category', 'Category')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='brand',
+            index=models.Index(fields=['updated_at', 'id'], name='catalog_bra_updated_54938a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['updated_at', 'id'], name='catalog_cat_updated_2d8292_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated_at', 'id'], name='catalog_pro_updated_ee0b6a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogtombstone',
+            index=models.Index(fields=['deleted_at'], name='catalog_cat_deleted_9af749_idx'),
+        ),
+        migrations.RunSQL(
+            sql=RATING_FUNCTION_SQL.replace("{updated_at}", ",\n            updated_at = now()"),
+            reverse_sql=RATING_FUNCTION_SQL.replace("{updated_at}", ""),
+        ),
+    ]
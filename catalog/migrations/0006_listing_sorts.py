@@ -0,0 +1,79 @@
+# Generated by Django 5.2 on 2026-10-17 18:39
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_catalog_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sales_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('created_at'), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_all_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('price'), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_all_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('name'), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_all_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.comparison.Coalesce(models.F('average_rating'), models.Value(0.0)), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_all_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('sales_count'), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_all_sales_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('category_id'), models.F('created_at'), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_cat_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('category_id'), models.F('price'), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_cat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('category_id'), models.F('name'), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_cat_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('category_id'), django.db.models.functions.comparison.Coalesce(models.F('average_rating'), models.Value(0.0)), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_cat_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('category_id'), models.F('sales_count'), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_cat_sales_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('brand_id'), models.F('created_at'), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_brand_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('brand_id'), models.F('price'), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_brand_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('brand_id'), models.F('name'), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_brand_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('brand_id'), django.db.models.functions.comparison.Coalesce(models.F('average_rating'), models.Value(0.0)), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_brand_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('brand_id'), models.F('sales_count'), models.F('id'), condition=models.Q(('is_active', True)), name='catalog_prd_brand_sales_idx'),
+        ),
+    ]
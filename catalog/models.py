@@ -1,16 +1,33 @@
 from django.db import models
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models import Avg
+from django.db.models import Avg, F, Q, Value, FloatField
+from django.db.models.functions import Cast, Coalesce, NullIf, Upper
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from asgiref.sync import sync_to_async
 from .utils import product_images_file_name, product_cover_file_name, brand_file_name
 
 
+def name_trigram_index(name: str) -> GinIndex:
+    """Trigram index matching the `UPPER(name) LIKE UPPER(...)` SQL of `icontains`/`istartswith`."""
+    return GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name=name)
+
+
 class Category(models.Model):
     name = models.CharField(max_length=200, unique=True)
     slug = models.SlugField(max_length=220, unique=True)
     description = models.TextField(null=True, blank=True)
 
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            name_trigram_index('catalog_category_name_trgm'),
+            models.Index(fields=['updated_at', 'id']),
+        ]
+
     def save(self, *args, **kwargs):
         self.slug = slugify(self.name)
         super().save(*args, **kwargs)
@@ -27,6 +44,11 @@ class Brand(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            name_trigram_index('catalog_brand_name_trgm'),
+            models.Index(fields=['updated_at', 'id']),
+        ]
 
     def save(self, *args, **kwargs):
         self.slug = slugify(self.name)
@@ -36,6 +58,51 @@ class Brand(models.Model):
         return self.name
 
 
+RATING_MIN = 0
+RATING_MAX = 10
+
+# Kept current by the `catalog_update_product_rating_aggregates` trigger (see migrations)
+RATING_AGGREGATE_FIELDS = ('rating_count', 'rating_sum', 'rating_histogram')
+
+
+# Text search configuration of `Product.search_vector`, queries must use the same one
+SEARCH_CONFIG = 'english'
+
+
+def empty_rating_histogram():
+    return [0] * (RATING_MAX - RATING_MIN + 1)
+
+
+# Kept current by the `orders_count_product_sales` trigger (see orders migrations)
+SALES_AGGREGATE_FIELDS = ('sales_count',)
+
+# `rating` listing sort key, unrated products rank as 0
+RATING_SORT_EXPRESSION = Coalesce(F('average_rating'), Value(0.0))
+
+# listing sort key -> indexed expression, see `catalog.filter_schemas.PRODUCT_SORTS`
+LISTING_SORT_KEYS = {
+    'created': F('created_at'),
+    'price': F('price'),
+    'name': F('name'),
+    'rating': RATING_SORT_EXPRESSION,
+    'sales': F('sales_count'),
+}
+
+
+def listing_indexes() -> list:
+    """Partial indexes serving every `GET /products` sort, unfiltered and per category or brand.
+
+    Each is `(prefix, sort key, id) WHERE is_active`, so a listing page is an index
+    range scan (backwards for descending sorts) that stops after `LIMIT` rows,
+    without a sort step.
+    """
+    return [
+        models.Index(*prefix, key, F('id'), name=f'catalog_prd_{scope}_{name}_idx', condition=Q(is_active=True))
+        for scope, prefix in (('all', []), ('cat', [F('category_id')]), ('brand', [F('brand_id')]))
+        for name, key in LISTING_SORT_KEYS.items()
+    ]
+
+
 class Product(models.Model):
     name = models.CharField(max_length=255)
     slug = models.SlugField(max_length=280, unique=True)
@@ -47,6 +114,23 @@ class Product(models.Model):
     brand = models.ForeignKey(Brand, on_delete=models.PROTECT, related_name='products', null=True, blank=True)
     cover_image = models.ImageField(upload_to=product_cover_file_name, null=True, blank=True)
 
+    # rating aggregates, histogram[i] is the number of ratings equal to i
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_histogram = ArrayField(models.PositiveIntegerField(), size=RATING_MAX - RATING_MIN + 1, default=empty_rating_histogram, editable=False)
+    average_rating = models.GeneratedField(
+        expression=Cast(F('rating_sum'), FloatField()) / NullIf(F('rating_count'), 0),
+        output_field=FloatField(),
+        db_persist=True,
+    )
+
+    # units sold in paid (then shipped/delivered) orders
+    sales_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # name (A), brand and category names (B) and description (C), kept current by the
+    # `catalog_update_product_search_vector` triggers (see migrations)
+    search_vector = SearchVectorField(null=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -56,6 +140,11 @@ class Product(models.Model):
         indexes = [
             models.Index(fields=['slug']),
             models.Index(fields=['is_active']),
+            models.Index(fields=['average_rating']),
+            GinIndex(fields=['search_vector']),
+            name_trigram_index('catalog_product_name_trgm'),
+            models.Index(fields=['updated_at', 'id']),
+            *listing_indexes(),
         ]
 
     # @property
@@ -73,6 +162,12 @@ class Product(models.Model):
                 slug = f"{base}-{i}"
                 i += 1
             self.slug = slug
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # never write back rating and sales aggregates loaded earlier, the triggers own them
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and not field.generated and field.name not in RATING_AGGREGATE_FIELDS + SALES_AGGREGATE_FIELDS
+            ]
         super().save(*args, **kwargs)
 
     def __str__(self) -> str:
@@ -89,8 +184,42 @@ class ProductRating(models.Model):
     rating = models.PositiveSmallIntegerField(
         default=0,
         validators=[
-            MinValueValidator(0, message='Rating cannot be less than 0'),
-            MaxValueValidator(10, message='Rating cannot be greater than 10')
+            MinValueValidator(RATING_MIN, message='Rating cannot be less than 0'),
+            MaxValueValidator(RATING_MAX, message='Rating cannot be greater than 10')
         ],
     )
     comment = models.TextField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # the rating aggregates trigger indexes the histogram by rating
+            models.CheckConstraint(
+                condition=models.Q(rating__gte=RATING_MIN, rating__lte=RATING_MAX),
+                name='rating_between_min_and_max',
+            ),
+        ]
+
+
+class CatalogTombstone(models.Model):
+    """Deleted products, brands and categories, so clients syncing with
+    `GET /products/changes` can drop them (written by `catalog.signals`)."""
+    PRODUCT = 'product'
+    BRAND = 'brand'
+    CATEGORY = 'category'
+    KIND_CHOICES = [
+        (PRODUCT, 'Product'),
+        (BRAND, 'Brand'),
+        (CATEGORY, 'Category'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at']),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind} #{self.object_id} deleted at {self.deleted_at}"
@@ -5,20 +5,24 @@ from typing import List, Optional
 from asgiref.sync import sync_to_async
 from ninja import Router, PatchDict, UploadedFile, Form, File
 from ninja_jwt.authentication import AsyncJWTAuth
+from ninja.decorators import decorate_view
 
 from .models import Brand
 from .schemas import BrandIn, BrandOut
+from .cache import conditional_catalog_response
 
 router = Router(tags=["brands"])
 
 
 @router.get("/brands", response=List[BrandOut])
+@decorate_view(conditional_catalog_response())
 async def list_brands(request):
     brands = await sync_to_async(list)(Brand.objects.all().order_by("-updated_at"))
     return brands
 
 
 @router.get("/brands/{brand_id}", response=BrandOut)
+@decorate_view(conditional_catalog_response())
 async def get_brand(request, brand_id: int):
     brand = await aget_object_or_404(Brand, id=brand_id)
     return brand
@@ -5,20 +5,24 @@ from typing import List
 from asgiref.sync import sync_to_async
 from ninja import Router, PatchDict
 from ninja_jwt.authentication import AsyncJWTAuth
+from ninja.decorators import decorate_view
 
 from .models import Category
 from .schemas import CategoryIn, CategoryOut
+from .cache import conditional_catalog_response
 
 router = Router(tags=["categories"])
 
 
 @router.get("/categories", response=List[CategoryOut])
+@decorate_view(conditional_catalog_response())
 async def list_categories(request):
     categories = await sync_to_async(list)(Category.objects.all().order_by("name"))
     return categories
 
 
 @router.get("/categories/{category_id}", response=CategoryOut)
+@decorate_view(conditional_catalog_response())
 async def get_category(request, category_id:int):
     category = await aget_object_or_404(Category, id=category_id)
     return category
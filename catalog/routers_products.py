@@ -1,59 +1,247 @@
-from functools import reduce
-
-from typing import List
+from typing import List, Literal, Optional
 from asgiref.sync import sync_to_async
-from ninja import Router, PatchDict
+from ninja import Router, PatchDict, File, UploadedFile
+from ninja.errors import HttpError
 from ninja_jwt.authentication import AsyncJWTAuth
 from ninja.pagination import paginate
 from ninja.decorators import decorate_view
 from ninja import Query
 
-from django.http import Http404
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
 from django.db import models
+from django.db.models.functions import Cast, Length
 from django.core.cache import cache
-from django.views.decorators.cache import cache_page
+from django.contrib.postgres.search import SearchRank
 
-from .models import Product, Category, Brand, ProductImage
-from .schemas import ProductIn, ProductOut
-from .filter_schemas import ProductFilterSchema
+from base.pagination import KeysetPagination
+from base.fieldsets import FieldsetQuery
+from .models import Product, Category, Brand, ProductImage, ProductRating
+from .schemas import ProductIn, ProductOut, ProductListOut, ProductListPageOut, ProductRatingIn, ProductRatingOut, SuggestionsOut, ProductFacetsOut, ProductImportOut, \
+    ProductBulkUpdateIn, ProductBulkUpdateOut, CatalogChangesOut, ProductBatchOut
+from .filter_schemas import ProductFilterSchema, ProductSort, PRODUCT_SORTS, PRODUCT_SORT_ANNOTATIONS, SALES_SORTS, product_search_query
+from .cache import cache_catalog_response, conditional_catalog_response, aget_catalog_version
+from .facets import aget_product_facets
+from .importer import import_format, read_rows, import_products
+from .bulk_update import bulk_update_products
+from .exporter import EXPORT_FORMATS, export_products
+from .sync import acatalog_changes_response
+from orders.recommendations import aget_related_product_ids
+from orders.rankings import atrending_product_ids
+from .fragments import PRODUCT_RELATIONS, product_fields, aget_product_fragments, aproduct_page_response, assemble, assemble_list, json_response
 
 router = Router(tags=["products"])
 
 
-@router.get("/products", response=List[ProductOut])
-@paginate
-# @decorate_view(cache_page(1 * 60))
-async def list_products(request, filters: Query[ProductFilterSchema] = None):
-    # WARNING: cache is not fully working yet and only experimental
+product_pagination = KeysetPagination()
+
+
+def product_list_values(filters: ProductFilterSchema, sort: Optional[ProductSort] = None):
+    """Ids and keyset keys of the `GET /products` rows, in listing order.
+
+    Searches are ordered by relevance unless a `sort` is given, other listings
+    default to the newest first.
+    """
+    qs = filters.filter(Product.objects.filter(is_active=True))
+    if filters.q and sort is None:
+        # ts_rank returns a `real`, cast so the value round-trips exactly through keyset cursors
+        rank = Cast(SearchRank(models.F("search_vector"), product_search_query(filters.q)), models.FloatField())
+        return qs.annotate(rank=rank).order_by("-rank", "-created_at").values("id", "created_at", "rank")
+
+    ordering = PRODUCT_SORTS[sort or "newest"]
+    keys = [field.lstrip("-") for field in ordering]
+    qs = qs.annotate(**{key: PRODUCT_SORT_ANNOTATIONS[key] for key in keys if key in PRODUCT_SORT_ANNOTATIONS})
+    return qs.order_by(*ordering).values(*keys)
+
+
+FIELDSET_PARAMS = {"fields": None, "expand": None}
+
+LIST_PARAMS = {"limit": settings.NINJA_PAGINATION_PER_PAGE, "offset": 0, "cursor": None, "sort": None, **FIELDSET_PARAMS}
+LIST_UNCACHED = {"sort": SALES_SORTS}
+
+
+def product_fieldset(fieldset: FieldsetQuery, variant: str):
+    return fieldset.resolve(product_fields(variant), PRODUCT_RELATIONS)
+
+
+@router.get("/products", response=ProductListPageOut)
+@decorate_view(conditional_catalog_response(ProductFilterSchema, params=LIST_PARAMS, uncached=LIST_UNCACHED))
+@decorate_view(cache_catalog_response(ProductFilterSchema, params=LIST_PARAMS, uncached=LIST_UNCACHED))
+async def list_products(request, filters: Query[ProductFilterSchema], pagination: Query[KeysetPagination.Input], fieldset: Query[FieldsetQuery],
+                        sort: Optional[ProductSort] = None):
+    selected = product_fieldset(fieldset, "list")
+    # only the page ids (and keyset keys) are queried, products come from the fragment cache
+    # (or, for a sparse fieldset, from a query selecting just the requested fields)
+    page = await product_pagination.apaginate_queryset(product_list_values(filters, sort), pagination, request)
+    return await aproduct_page_response(page, selected=selected)
+
+
+@router.get("/products/facets", response=ProductFacetsOut)
+@decorate_view(cache_catalog_response(ProductFilterSchema))
+async def product_facets(request, filters: Query[ProductFilterSchema]):
+    return await aget_product_facets(filters)
 
-    filters_applied = reduce(lambda x, y : None if x is None and y is None else True ,filters.dict().values())
-    cached_products = cache.get("products")
-    if cached_products and not filters_applied:
-        return cached_products
 
-    qs = Product.objects.filter(is_active=True) \
-                        .select_related("category", "brand") \
-                        .prefetch_related("images", "ratings") \
-                        .annotate(average_rating=models.Avg("ratings__rating")) \
-                        .order_by("-created_at")
+def suggestions_queryset(model, kind: str, prefix: str, limit: int, *ordering, **filters):
+    # names starting with the prefix first, then names containing it (both served by the trigram index)
+    return model.objects.filter(name__icontains=prefix, **filters) \
+                        .annotate(kind=models.Value(kind), starts=models.Case(models.When(name__istartswith=prefix, then=0), default=1)) \
+                        .order_by("starts", *ordering, Length("name"), "name") \
+                        .values("kind", "id", "name", "slug")[:limit]
+
+
+@router.get("/products/suggest", response=SuggestionsOut)
+async def suggest(request, prefix: str = Query(..., min_length=2, max_length=100), limit: int = Query(5, ge=1, le=20)):
+    prefix = prefix.strip().lower()
+
+    # only short prefixes are hot enough to be worth caching, which also bounds the number of keys
+    key = None
+    if len(prefix) <= settings.CATALOG_SUGGEST_CACHED_PREFIX_LENGTH:
+        key = f"catalog:{await aget_catalog_version()}:suggest:{limit}:{prefix}"
+        suggestions = await cache.aget(key)
+        if suggestions is not None:
+            return suggestions
+
+    # one round trip for the three lists
+    qs = suggestions_queryset(Product, "products", prefix, limit, "-rating_count", is_active=True).union(
+        suggestions_queryset(Brand, "brands", prefix, limit),
+        suggestions_queryset(Category, "categories", prefix, limit),
+        all=True,
+    )
+    suggestions = {"products": [], "brands": [], "categories": []}
+    async for row in qs:
+        suggestions[row.pop("kind")].append(row)
+
+    if key:
+        await cache.aset(key, suggestions, settings.CATALOG_CACHE_TIMEOUT)
+    return suggestions
+
+
+@router.post("/products/import", auth=AsyncJWTAuth(), response=ProductImportOut)
+async def import_products_file(request, file: File[UploadedFile], format: Optional[Literal["ndjson", "csv"]] = None):
+    if not request.user.is_staff:
+        raise HttpError(403, "Forbidden")
+
+    format = format or import_format(file.name)
+    if format is None:
+        raise HttpError(400, "Can't tell the file format from its name, pass `format`")
+
+    # rows are parsed while they are imported, the upload is never loaded as a whole
+    rows = read_rows(file.file, format)
+    return await sync_to_async(import_products)(rows, max_errors=settings.CATALOG_IMPORT_MAX_REPORTED_ERRORS)
+
+
+@router.patch("/products", auth=AsyncJWTAuth(), response=ProductBulkUpdateOut)
+async def bulk_update_products_prices(request, payload: ProductBulkUpdateIn):
+    if not request.user.is_staff:
+        raise HttpError(403, "Forbidden")
 
-    if filters_applied:
-        qs = filters.filter(qs)
-        return qs
+    return await sync_to_async(bulk_update_products)(payload.items)
+
+
+@router.get("/products/export", auth=AsyncJWTAuth())
+async def export_products_file(request, format: Literal["ndjson", "csv"] = "ndjson"):
+    if not request.user.is_staff:
+        raise HttpError(403, "Forbidden")
+
+    response = StreamingHttpResponse(export_products(format), content_type=EXPORT_FORMATS[format])
+    response["Content-Disposition"] = f'attachment; filename="products.{format}"'
+    return response
+
+
+PRODUCT_BATCH_MAX_SIZE = 200
+
+
+def _batch_values(raw: str) -> list:
+    # comma separated, order kept, duplicates dropped
+    return list(dict.fromkeys(value.strip() for value in raw.split(",") if value.strip()))
+
+
+@router.get("/products/batch", response=ProductBatchOut)
+async def get_products_batch(request, fieldset: Query[FieldsetQuery],
+                             ids: Optional[str] = Query(None, description="Comma separated ids"),
+                             slugs: Optional[str] = Query(None, description="Comma separated slugs")):
+    if (ids is None) == (slugs is None):
+        raise HttpError(400, "Pass either ids or slugs")
+    selected = product_fieldset(fieldset, "list")
+    keys = _batch_values(ids or slugs)
+    if len(keys) > PRODUCT_BATCH_MAX_SIZE:
+        raise HttpError(400, f"At most {PRODUCT_BATCH_MAX_SIZE} products per batch")
+
+    if ids is not None:
+        try:
+            keys = [int(key) for key in keys]
+        except ValueError:
+            raise HttpError(400, "ids must be integers")
+        product_ids = dict(zip(keys, keys))
     else:
-        # cache unfiltered products
-        products = await sync_to_async(list)(qs)
-        cache.set("products", products, 1 * 60)
-        return products
-    # return qs   # if no cache
+        product_ids = {slug: product_id async for slug, product_id in Product.objects.filter(slug__in=keys).values_list("slug", "id")}
+
+    # cached fragments are fetched in one MGET, only the misses are rendered (in one query)
+    fragments = await aget_product_fragments([product_ids[key] for key in keys if key in product_ids], "list", selected)
+    found = [key for key in keys if product_ids.get(key) in fragments]
+    return json_response(assemble({
+        "items": assemble_list(fragments[product_ids[key]] for key in found),
+        "missing": [key for key in keys if product_ids.get(key) not in fragments],
+    }))
+
+
+@router.get("/products/trending", response=List[ProductListOut])
+@decorate_view(cache_catalog_response(params={"days": 7, "limit": 20, "category": None, **FIELDSET_PARAMS}, timeout=settings.PRODUCT_TRENDING_CACHE_TIMEOUT))
+async def trending_products(request, fieldset: Query[FieldsetQuery],
+                            days: int = Query(7, ge=1, le=settings.PRODUCT_SALES_RETENTION_DAYS),
+                            limit: int = Query(20, ge=1, le=50), category: Optional[int] = None):
+    selected = product_fieldset(fieldset, "list")
+    # summed from the daily sales buckets, see `orders.rankings`
+    product_ids = await atrending_product_ids(days, limit, category)
+    fragments = await aget_product_fragments(product_ids, "list", selected)
+    return json_response(assemble_list(fragments[pk] for pk in product_ids if pk in fragments))
+
+
+@router.get("/products/changes", response=CatalogChangesOut)
+async def catalog_changes(request, since: Optional[str] = None, limit: int = Query(500, ge=1, le=1000)):
+    return await acatalog_changes_response(since, limit)
+
 
 @router.get("/products/{product_id}", response=ProductOut)
-async def get_product(request, product_id: int):
-    qs = Product.objects.filter(id=product_id).select_related("category", "brand").prefetch_related("images", "ratings").annotate(average_rating=models.Avg("ratings__rating"))
-    p = await sync_to_async(qs.first)()
-    if not p:
+@decorate_view(conditional_catalog_response(params=FIELDSET_PARAMS))
+async def get_product(request, product_id: int, fieldset: Query[FieldsetQuery]):
+    selected = product_fieldset(fieldset, "detail")
+    fragments = await aget_product_fragments([product_id], "detail", selected)
+    if product_id not in fragments:
+        raise Http404
+    return json_response(fragments[product_id])
+
+
+@router.get("/products/{product_id}/related", response=List[ProductListOut])
+@decorate_view(cache_catalog_response(params={"limit": 10, **FIELDSET_PARAMS}))
+async def related_products(request, product_id: int, fieldset: Query[FieldsetQuery], limit: int = Query(10, ge=1, le=20)):
+    selected = product_fieldset(fieldset, "list")
+    product = await Product.objects.filter(id=product_id).values("category_id").afirst()
+    if product is None:
+        raise Http404
+
+    # frequently bought together, precomputed by `manage.py build_product_recommendations`
+    product_ids = await aget_related_product_ids(product_id, product["category_id"], limit)
+    fragments = await aget_product_fragments(product_ids, "list", selected)
+    return json_response(assemble_list(fragments[pk] for pk in product_ids if pk in fragments))
+
+
+@router.get("/products/{product_id}/ratings", response=List[ProductRatingOut])
+@decorate_view(cache_catalog_response(params={"limit": settings.NINJA_PAGINATION_PER_PAGE, "offset": 0, "cursor": None}))
+@paginate(KeysetPagination)
+async def list_product_ratings(request, product_id: int):
+    if not await Product.objects.filter(id=product_id).aexists():
+        raise Http404
+    return ProductRating.objects.filter(product_id=product_id).order_by("-id")
+
+
+@router.post("/products/{product_id}/ratings", auth=AsyncJWTAuth(), response=ProductRatingOut)
+async def rate_product(request, product_id: int, payload: ProductRatingIn):
+    if not await Product.objects.filter(id=product_id, is_active=True).aexists():
         raise Http404
-    return p
+    rating = await ProductRating.objects.acreate(product_id=product_id, **payload.dict())
+    return rating
 
 
 # todo: add images upload (for cover and product images)
@@ -82,7 +270,7 @@ async def create_product(request, payload: PatchDict[ProductIn]):
         brand=brand,
     )
     await sync_to_async(product.save)()
-    return await get_product(request, product.id)
+    return await get_product(request, product.id, FieldsetQuery())
 
 
 # todo: add images upload (for cover and product images)
@@ -124,7 +312,7 @@ async def update_product(request, product_id: int, payload: ProductIn):
     # product.category_id = payload.category_id
     # product.brand_id = payload.brand_id
     await sync_to_async(product.save)()
-    return await get_product(request, product.id)
+    return await get_product(request, product.id, FieldsetQuery())
 
 
 @router.delete("/products/{product_id}", auth=AsyncJWTAuth())
@@ -1,10 +1,11 @@
-from typing import Optional
+from typing import Optional, Literal, Union
 from typing import List
-from ninja import Schema, ModelSchema
+from pydantic import model_validator
+from ninja import Schema, ModelSchema, Field
 from decimal import Decimal
 from ninja.orm import create_schema
 
-from catalog.models import Product, ProductImage, ProductRating, Category, Brand
+from catalog.models import Product, ProductImage, ProductRating, Category, Brand, RATING_MIN, RATING_MAX
 
 
 # Category
@@ -42,7 +43,7 @@ class ProductImageOut(ModelSchema):
 
 # Product rating
 class ProductRatingIn(ModelSchema):
-    product_id: int
+    rating: int = Field(..., ge=RATING_MIN, le=RATING_MAX)
     class Meta:
         model = ProductRating
         fields = ['rating', 'comment']
@@ -51,7 +52,7 @@ class ProductRatingIn(ModelSchema):
 class ProductRatingOut(ModelSchema):
     class Meta:
         model = ProductRating
-        fields = ['rating', 'comment']
+        fields = ['id', 'rating', 'comment']
 
 
 # Product
@@ -62,16 +63,155 @@ class ProductIn(ModelSchema):
     # ratings: List[ProductRatingOut] = []
     class Meta:
         model = Product
-        exclude = ['id', 'created_at', 'updated_at', 'slug']
+        exclude = ['id', 'created_at', 'updated_at', 'slug', 'rating_count', 'rating_sum', 'rating_histogram', 'average_rating', 'sales_count', 'search_vector']
 
 
 class ProductOut(ModelSchema):
     category: Optional[CategoryOut] = None
     brand: Optional[BrandOut] = None
     images: List[ProductImageOut] = []
-    ratings: List[ProductRatingOut] = []
     average_rating: Optional[float] = None
 
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ['sales_count', 'search_vector']
+
+
+# ratings themselves are served by `GET /products/{id}/ratings`, listings only carry the summary
+class ProductListOut(ModelSchema):
+    category: Optional[CategoryOut] = None
+    brand: Optional[BrandOut] = None
+    images: List[ProductImageOut] = []
+    average_rating: Optional[float] = None
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'name', 'slug', 'description', 'price', 'stock', 'is_active', 'category', 'brand',
+            'cover_image', 'rating_count', 'average_rating', 'created_at', 'updated_at',
+        ]
+
+
+# Bulk import (see `catalog.importer`), one NDJSON object or CSV row per product
+class ProductImportRow(Schema):
+    name: str = Field(..., min_length=1, max_length=255)
+    # rows with a slug are upserted on it, rows without one always create a product
+    slug: Optional[str] = Field(None, max_length=280, pattern=r'^[-a-zA-Z0-9_]+$')
+    description: Optional[str] = None
+    price: Decimal = Field(..., ge=0, max_digits=10, decimal_places=2)
+    stock: int = Field(0, ge=0)
+    is_active: bool = True
+    category: Optional[str] = Field(None, min_length=1, max_length=200)
+    brand: Optional[str] = Field(None, min_length=1, max_length=200)
+
+
+class ProductImportErrorOut(Schema):
+    row: int
+    errors: List[str]
+
+
+class ProductImportOut(Schema):
+    created: int
+    updated: int
+    failed: int
+    errors: List[ProductImportErrorOut]
+
+
+# Bulk price/stock update (see `catalog.bulk_update`), rows target a product by `id` or `slug`
+class ProductBulkUpdateRow(Schema):
+    id: Optional[int] = None
+    slug: Optional[str] = Field(None, max_length=280)
+    price: Optional[Decimal] = Field(None, ge=0, max_digits=10, decimal_places=2)
+    stock: Optional[int] = Field(None, ge=0)
+    is_active: Optional[bool] = None
+
+    @model_validator(mode='after')
+    def check_target_and_changes(self):
+        if (self.id is None) == (self.slug is None):
+            raise ValueError('exactly one of id or slug is required')
+        if self.price is None and self.stock is None and self.is_active is None:
+            raise ValueError('nothing to update, set price, stock or is_active')
+        return self
+
+
+class ProductBulkUpdateIn(Schema):
+    items: List[ProductBulkUpdateRow] = Field(..., min_length=1, max_length=10000)
+
+
+class ProductBulkUpdateResultOut(Schema):
+    index: int
+    id: Optional[int] = None
+    status: Literal['updated', 'not_found', 'superseded']
+
+
+class ProductBulkUpdateOut(Schema):
+    updated: int
+    not_found: int
+    results: List[ProductBulkUpdateResultOut]
+
+
+# `GET /products` page, assembled from cached fragments (see `catalog.fragments`)
+class ProductListPageOut(Schema):
+    items: List[ProductListOut]
+    count: Optional[int] = None
+    next_cursor: Optional[str] = None
+
+
+# `GET /products/batch`, `missing` holds the requested ids (or slugs) that don't exist
+class ProductBatchOut(Schema):
+    items: List[ProductListOut]
+    missing: List[Union[int, str]]
+
+
+# `GET /products/changes` (see `catalog.sync`)
+class CatalogDeletedOut(Schema):
+    products: List[int] = []
+    brands: List[int] = []
+    categories: List[int] = []
+
+
+class CatalogChangesOut(Schema):
+    products: List[ProductListOut]
+    brands: List[BrandOut]
+    categories: List[CategoryOut]
+    deleted: CatalogDeletedOut
+    next_token: str
+    has_more: bool
+
+
+# Autocomplete
+class SuggestionOut(Schema):
+    id: int
+    name: str
+    slug: str
+
+
+class SuggestionsOut(Schema):
+    products: List[SuggestionOut] = []
+    brands: List[SuggestionOut] = []
+    categories: List[SuggestionOut] = []
+
+
+# Facets
+class FacetCountOut(Schema):
+    id: int
+    name: str
+    count: int
+
+
+class PriceBandCountOut(Schema):
+    min_price: Decimal
+    max_price: Optional[Decimal] = None
+    count: int
+
+
+class AvailabilityCountOut(Schema):
+    in_stock: int
+    out_of_stock: int
+
+
+class ProductFacetsOut(Schema):
+    brands: List[FacetCountOut]
+    categories: List[FacetCountOut]
+    price_bands: List[PriceBandCountOut]
+    availability: AvailabilityCountOut
@@ -0,0 +1,68 @@
+from cachalot.api import invalidate
+from django.db.models.signals import post_save, post_delete
+
+from .models import Product, ProductImage, ProductRating, Category, Brand, CatalogTombstone
+from .cache import bump_catalog_version
+from .fragments import invalidate_product_fragments
+
+
+CATALOG_MODELS = (Product, ProductImage, ProductRating, Category, Brand)
+
+
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(invalidate_catalog_cache, sender=model, dispatch_uid=f"invalidate_catalog_cache_on_save_{model.__name__}")
+    post_delete.connect(invalidate_catalog_cache, sender=model, dispatch_uid=f"invalidate_catalog_cache_on_delete_{model.__name__}")
+
+
+# rows whose writes are propagated to catalog_product by DB triggers
+# (rating aggregates, search vectors of renamed brands/categories)
+TRIGGER_PROPAGATED_MODELS = (ProductRating, Category, Brand)
+
+
+def invalidate_trigger_updated_products(sender, **kwargs):
+    # cachalot can't see trigger writes, so its cached product queries are dropped here
+    invalidate(Product)
+
+
+for model in TRIGGER_PROPAGATED_MODELS:
+    post_save.connect(invalidate_trigger_updated_products, sender=model, dispatch_uid=f"invalidate_trigger_updated_products_on_save_{model.__name__}")
+    post_delete.connect(invalidate_trigger_updated_products, sender=model, dispatch_uid=f"invalidate_trigger_updated_products_on_delete_{model.__name__}")
+
+
+def invalidate_fragments_of_product(sender, instance, **kwargs):
+    invalidate_product_fragments([instance.pk])
+
+
+def invalidate_fragments_of_related_product(sender, instance, **kwargs):
+    invalidate_product_fragments([instance.product_id])
+
+
+def invalidate_fragments_of_grouped_products(sender, instance, **kwargs):
+    # brand and category are embedded in the fragments of all their products
+    lookup = {sender._meta.model_name: instance}
+    invalidate_product_fragments(Product.objects.filter(**lookup).values_list("id", flat=True))
+
+
+FRAGMENT_HANDLERS = (
+    (Product, invalidate_fragments_of_product),
+    (ProductImage, invalidate_fragments_of_related_product),
+    (ProductRating, invalidate_fragments_of_related_product),
+    (Category, invalidate_fragments_of_grouped_products),
+    (Brand, invalidate_fragments_of_grouped_products),
+)
+
+for model, handler in FRAGMENT_HANDLERS:
+    post_save.connect(handler, sender=model, dispatch_uid=f"invalidate_product_fragments_on_save_{model.__name__}")
+    post_delete.connect(handler, sender=model, dispatch_uid=f"invalidate_product_fragments_on_delete_{model.__name__}")
+
+
+def record_tombstone(sender, instance, **kwargs):
+    CatalogTombstone.objects.create(kind=sender._meta.model_name, object_id=instance.pk)
+
+
+for model in (Product, Brand, Category):
+    post_delete.connect(record_tombstone, sender=model, dispatch_uid=f"record_tombstone_{model.__name__}")
@@ -0,0 +1,74 @@
+import os
+import gzip
+import time
+import tempfile
+
+import brotli
+from asgiref.sync import async_to_sync
+
+from base.pagination import KeysetPagination
+from .cache import CATALOG_SNAPSHOT_NAMES, catalog_snapshot_path, get_catalog_version, discard_catalog_snapshot
+from .filter_schemas import ProductFilterSchema
+from .fragments import dumps, aproduct_page_response
+from .schemas import BrandOut, CategoryOut
+from .routers_products import product_pagination, product_list_values
+from .routers_brands import list_brands
+from .routers_categories import list_categories
+
+
+async def arender_catalog_snapshot() -> dict:
+    """Bodies of the argument-less `GET /products`, `/categories` and `/brands`,
+    rendered by the same code as the endpoints."""
+    page = await product_pagination.apaginate_queryset(
+        product_list_values(ProductFilterSchema()), KeysetPagination.Input(), None,
+    )
+    return {
+        "products": (await aproduct_page_response(page)).content,
+        "categories": dumps([CategoryOut.from_orm(category).model_dump() for category in await list_categories(None)]),
+        "brands": dumps([BrandOut.from_orm(brand).model_dump() for brand in await list_brands(None)]),
+    }
+
+
+def _write_atomically(path, content: bytes):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def build_catalog_snapshot() -> str:
+    """Write the snapshot files (plain, gzip and brotli) and return the catalog version they show."""
+    version = get_catalog_version()
+    bodies = async_to_sync(arender_catalog_snapshot)()
+
+    catalog_snapshot_path(CATALOG_SNAPSHOT_NAMES[0]).parent.mkdir(parents=True, exist_ok=True)
+    for name, body in bodies.items():
+        # the plain file goes last, nginx only uses a snapshot once it exists
+        _write_atomically(catalog_snapshot_path(name, ".gz"), gzip.compress(body, compresslevel=9, mtime=0))
+        _write_atomically(catalog_snapshot_path(name, ".br"), brotli.compress(body))
+        _write_atomically(catalog_snapshot_path(name), body)
+
+    if get_catalog_version() != version:
+        # a write landed while rendering, don't serve what may predate it
+        discard_catalog_snapshot()
+    return version
+
+
+def watch_catalog_snapshot(interval: float, max_age: float, stdout, stderr):
+    """Rebuild the snapshot when the catalog version changes, at most once per `interval`
+    (so bursts of writes cause a single rebuild), and at least once per `max_age`."""
+    built_version, built_at = None, 0.0
+    while True:
+        try:
+            if get_catalog_version() != built_version or time.monotonic() - built_at > max_age:
+                built_version, built_at = build_catalog_snapshot(), time.monotonic()
+                stdout.write(f"Built catalog snapshot for version {built_version}")
+        except Exception as exc:
+            # requests fall through to Django meanwhile, keep watching
+            stderr.write(f"Catalog snapshot failed: {exc!r}")
+        time.sleep(interval)
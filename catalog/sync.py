@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import timezone
+from ninja.errors import HttpError
+
+from base.pagination import KeysetPagination
+from .models import Product, Brand, Category, CatalogTombstone
+from .schemas import BrandOut, CategoryOut
+from .fragments import aget_product_fragments, assemble, assemble_list, json_response
+
+
+# tombstone kind -> key of the response `deleted` lists
+DELETED_KEYS = {
+    CatalogTombstone.PRODUCT: "products",
+    CatalogTombstone.BRAND: "brands",
+    CatalogTombstone.CATEGORY: "categories",
+}
+
+
+def encode_sync_token(updated_at: datetime, product_id: Optional[int] = None) -> str:
+    return KeysetPagination.encode_cursor([updated_at, product_id])
+
+
+def decode_sync_token(token: str):
+    try:
+        updated_at, product_id = KeysetPagination.decode_cursor(token, 2)
+        updated_at = datetime.fromisoformat(updated_at)
+    except (HttpError, TypeError, ValueError):
+        raise HttpError(400, "Invalid token")
+    if timezone.is_naive(updated_at) or not (product_id is None or isinstance(product_id, int)):
+        raise HttpError(400, "Invalid token")
+    return updated_at, product_id
+
+
+async def acatalog_changes_response(token: Optional[str], limit: int) -> HttpResponse:
+    """Products, brands and categories changed or deleted since `token`, and the next token.
+
+    Only rows older than `CATALOG_SYNC_LAG_SECONDS` are returned, so a write whose
+    transaction was still open when the previous token was issued can't be skipped.
+    Products are paged by `(updated_at, id)`; when `has_more` is set the client
+    keeps asking with the returned token. Brands, categories and deletions are
+    small and sent whole, possibly again on the next page (applying them is
+    idempotent). Without a token the whole catalog is returned.
+    """
+    now = timezone.now()
+    horizon = now - timedelta(seconds=settings.CATALOG_SYNC_LAG_SECONDS)
+    since, since_id = decode_sync_token(token) if token else (None, None)
+    if since and since < now - timedelta(days=settings.CATALOG_SYNC_TOMBSTONE_RETENTION_DAYS):
+        raise HttpError(410, "Token expired, download the full catalog again")
+
+    def changed(qs, field="updated_at"):
+        qs = qs.filter(**{f"{field}__lte": horizon})
+        return qs.filter(**{f"{field}__gt": since}) if since else qs
+
+    products = Product.objects.filter(updated_at__lte=horizon).order_by("updated_at", "id")
+    if since and since_id is not None:
+        products = products.filter(KeysetPagination.after_position(["updated_at", "id"], [since, since_id]))
+    elif since:
+        products = products.filter(updated_at__gt=since)
+    rows = [row async for row in products.values("id", "updated_at")[:limit + 1]]
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_token = encode_sync_token(rows[-1]["updated_at"], rows[-1]["id"]) if has_more else encode_sync_token(horizon)
+
+    product_ids = [row["id"] for row in rows]
+    fragments = await aget_product_fragments(product_ids, "list")
+    brands = [BrandOut.from_orm(brand).model_dump() async for brand in changed(Brand.objects.order_by("updated_at", "id"))]
+    categories = [CategoryOut.from_orm(category).model_dump() async for category in changed(Category.objects.order_by("updated_at", "id"))]
+
+    deleted = {key: [] for key in DELETED_KEYS.values()}
+    if since:
+        async for kind, object_id in changed(CatalogTombstone.objects.order_by("deleted_at"), "deleted_at").values_list("kind", "object_id"):
+            deleted[DELETED_KEYS[kind]].append(object_id)
+
+    return json_response(assemble({
+        "products": assemble_list(fragments[product_id] for product_id in product_ids if product_id in fragments),
+        "brands": brands,
+        "categories": categories,
+        "deleted": deleted,
+        "next_token": next_token,
+        "has_more": has_more,
+    }))
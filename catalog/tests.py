@@ -0,0 +1,326 @@
+import json
+import tempfile
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from ninja_jwt.tokens import RefreshToken
+
+from base.pagination import KeysetPagination
+from users.models import User
+
+from .cache import catalog_snapshot_path, get_catalog_version
+from .filter_schemas import PRODUCT_SORTS
+from .fragments import invalidate_product_fragments
+from .listing_plans import FILTER_CASES, OFFENDING_NODES, disable_sorts_and_seqscans, listing_plan
+from .models import Brand, CatalogTombstone, Category, Product, ProductImage, ProductRating
+
+
+# the catalog caches live in the default cache, a local one keeps the tests apart from Redis
+LOCAL_CACHE = override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    CACHALOT_ENABLED=False,
+)
+
+
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def product_names(self, response):
+        return [product["name"] for product in response.json()["items"]]
+
+
+@LOCAL_CACHE
+class KeysetPaginationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        # prices repeat, so the pages have to break ties on the id
+        for i in range(7):
+            Product.objects.create(name=f"P{i}", price=i // 3 + 1)
+
+    def walk(self, query=""):
+        names, cursor = [], ""
+        while cursor is not None:
+            body = self.client.get(f"/api/v1/products?limit=3&cursor={cursor}&{query}").json()
+            self.assertIsNone(body["count"])
+            names += [product["name"] for product in body["items"]]
+            cursor = body["next_cursor"]
+        return names
+
+    def test_cursor_pages_match_the_offset_listing(self):
+        for sort in PRODUCT_SORTS:
+            with self.subTest(sort=sort):
+                listing = self.product_names(self.client.get(f"/api/v1/products?limit=100&sort={sort}"))
+                self.assertEqual(len(listing), 7)
+                self.assertEqual(self.walk(f"sort={sort}"), listing)
+
+    def test_invalid_cursors_are_rejected(self):
+        cursors = ["!!!", KeysetPagination.encode_cursor([1]), KeysetPagination.encode_cursor(["not a date", 1]),
+                   KeysetPagination.encode_cursor(["2026-01-01T00:00:00+00:00", "x"])]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f"/api/v1/products?cursor={cursor}")
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"detail": "Invalid cursor"})
+
+
+@LOCAL_CACHE
+class CatalogInvalidationTests(CatalogTestCase):
+    def assertBumpsVersion(self, write):
+        version = get_catalog_version()
+        write()
+        self.assertNotEqual(get_catalog_version(), version)
+
+    def test_catalog_writes_bump_the_version(self):
+        category = Category.objects.create(name="Fruit")
+        brand = Brand.objects.create(name="Farm")
+        product = Product.objects.create(name="Apple", price=1, category=category, brand=brand)
+        writes = {
+            "category save": lambda: category.save(),
+            "brand save": lambda: brand.save(),
+            "product create": lambda: Product.objects.create(name="Pear", price=2),
+            "product save": lambda: product.save(),
+            "image create": lambda: ProductImage.objects.create(product=product, image="apple.jpg"),
+            "rating create": lambda: ProductRating.objects.create(product=product, rating=4),
+            "rating delete": lambda: product.ratings.get().delete(),
+            "product delete": lambda: product.delete(),
+        }
+        for name, write in writes.items():
+            with self.subTest(write=name):
+                self.assertBumpsVersion(write)
+
+    def test_cached_listing_is_refreshed_by_a_write(self):
+        Product.objects.create(name="Apple", price=1)
+        self.assertEqual(self.product_names(self.client.get("/api/v1/products")), ["Apple"])
+        Product.objects.create(name="Pear", price=2)
+        self.assertEqual(self.product_names(self.client.get("/api/v1/products")), ["Pear", "Apple"])
+
+    def test_etag_changes_with_the_catalog(self):
+        product = Product.objects.create(name="Apple", price=1)
+        etag = self.client.get("/api/v1/products").headers["ETag"]
+        self.assertEqual(self.client.get("/api/v1/products", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        product.price = 3
+        product.save()
+        response = self.client.get("/api/v1/products", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_product_fragment_follows_product_and_brand_writes(self):
+        brand = Brand.objects.create(name="Farm")
+        product = Product.objects.create(name="Apple", price=1, brand=brand)
+        self.client.get(f"/api/v1/products/{product.pk}")
+
+        product.name = "Green apple"
+        product.save()
+        brand.name = "Orchard"
+        brand.save()
+        body = self.client.get(f"/api/v1/products/{product.pk}").json()
+        self.assertEqual((body["name"], body["brand"]["name"]), ("Green apple", "Orchard"))
+
+    def test_write_discards_the_snapshot(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(CATALOG_SNAPSHOT_ROOT=root):
+            path = catalog_snapshot_path("products")
+            path.write_bytes(b"{}")
+            Product.objects.create(name="Apple", price=1)
+            self.assertFalse(path.exists())
+
+
+@LOCAL_CACHE
+@override_settings(CATALOG_SYNC_LAG_SECONDS=0)
+class TombstoneTests(CatalogTestCase):
+    def test_deletes_record_tombstones(self):
+        category = Category.objects.create(name="Fruit")
+        brand = Brand.objects.create(name="Farm")
+        product = Product.objects.create(name="Apple", price=1)
+        deleted = {CatalogTombstone.CATEGORY: category.pk, CatalogTombstone.BRAND: brand.pk, CatalogTombstone.PRODUCT: product.pk}
+        for instance in (product, brand, category):
+            instance.delete()
+        self.assertEqual(dict(CatalogTombstone.objects.values_list("kind", "object_id")), deleted)
+
+    def test_changes_report_deletions_since_the_token(self):
+        kept, removed = Product.objects.create(name="Apple", price=1), Product.objects.create(name="Pear", price=2)
+        token = self.client.get("/api/v1/products/changes").json()["next_token"]
+        removed_id = removed.pk
+        removed.delete()
+
+        body = self.client.get(f"/api/v1/products/changes?since={token}").json()
+        self.assertEqual(body["deleted"], {"products": [removed_id], "brands": [], "categories": []})
+        self.assertNotIn(kept.pk, [product["id"] for product in body["products"]])
+
+
+class ListingPlanTests(TestCase):
+    def test_every_listing_is_served_by_an_index_scan(self):
+        disable_sorts_and_seqscans()
+        for sort in PRODUCT_SORTS:
+            for case, params in FILTER_CASES.items():
+                with self.subTest(sort=sort, filters=case):
+                    nodes = [node["Node Type"] for node in listing_plan(sort, params)]
+                    self.assertFalse(set(nodes) & set(OFFENDING_NODES), nodes)
+
+
+@LOCAL_CACHE
+class SalesSortCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = [Product.objects.create(name=f"P{i}", price=i + 1) for i in range(3)]
+
+    def test_sales_sorts_are_not_cached(self):
+        for sort in ("best_selling", "popular"):
+            with self.subTest(sort=sort):
+                response = self.client.get(f"/api/v1/products?sort={sort}")
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn("ETag", response.headers)
+                self.assertNotIn("Last-Modified", response.headers)
+
+    def test_sales_sorts_follow_sales_without_a_catalog_write(self):
+        self.assertEqual(self.product_names(self.client.get("/api/v1/products?sort=best_selling")), ["P2", "P1", "P0"])
+        # what the order status trigger does, without bumping the catalog version
+        Product.objects.filter(pk=self.products[0].pk).update(sales_count=10)
+        self.assertEqual(self.product_names(self.client.get("/api/v1/products?sort=best_selling")), ["P0", "P2", "P1"])
+
+    def test_other_sorts_keep_their_validators(self):
+        response = self.client.get("/api/v1/products?sort=price_asc")
+        self.assertIn("ETag", response.headers)
+        response = self.client.get("/api/v1/products?sort=price_asc", HTTP_IF_NONE_MATCH=response.headers["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+
+@LOCAL_CACHE
+class RatingRebuildTests(CatalogTestCase):
+    def test_rebuild_drops_the_fragments_of_fixed_products(self):
+        product = Product.objects.create(name="P", price=1)
+        # aggregates drifted from the ratings, and rendered into the fragment cache
+        Product.objects.filter(pk=product.pk).update(rating_count=5, rating_sum=20)
+        invalidate_product_fragments([product.pk])
+        self.assertEqual(self.client.get(f"/api/v1/products/{product.pk}").json()["rating_count"], 5)
+
+        call_command("rebuild_product_ratings", stdout=StringIO())
+
+        body = self.client.get(f"/api/v1/products/{product.pk}").json()
+        self.assertEqual((body["rating_count"], body["rating_sum"], body["average_rating"]), (0, 0, None))
+
+
+@LOCAL_CACHE
+@override_settings(CATALOG_PRICE_BANDS=[0, 10, 100])
+class FacetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fruit, self.dairy = Category.objects.create(name="Fruit"), Category.objects.create(name="Dairy")
+        self.farm, self.dairyland = Brand.objects.create(name="Farm"), Brand.objects.create(name="Dairyland")
+        Product.objects.create(name="Apple", price=5, stock=3, category=self.fruit, brand=self.farm)
+        Product.objects.create(name="Pear", price=50, stock=0, category=self.fruit, brand=self.farm)
+        Product.objects.create(name="Milk", price=20, stock=1, category=self.dairy, brand=self.dairyland)
+        Product.objects.create(name="Old milk", price=20, stock=1, category=self.dairy, brand=self.dairyland, is_active=False)
+
+    def counts(self, facet):
+        return {row["name"]: row["count"] for row in facet}
+
+    def test_counts_of_the_whole_catalog(self):
+        body = self.client.get("/api/v1/products/facets").json()
+        self.assertEqual(self.counts(body["categories"]), {"Fruit": 2, "Dairy": 1})
+        self.assertEqual(self.counts(body["brands"]), {"Farm": 2, "Dairyland": 1})
+        self.assertEqual([band["count"] for band in body["price_bands"]], [1, 2])
+        self.assertEqual(body["availability"], {"in_stock": 2, "out_of_stock": 1})
+
+    def test_a_dimension_ignores_its_own_filter(self):
+        body = self.client.get(f"/api/v1/products/facets?category={self.fruit.pk}").json()
+        self.assertEqual(self.counts(body["categories"]), {"Fruit": 2, "Dairy": 1})
+        self.assertEqual(self.counts(body["brands"]), {"Farm": 2})
+        self.assertEqual(body["availability"], {"in_stock": 1, "out_of_stock": 1})
+
+
+class StaffTestCase(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user(email="staff@example.com", password="pw", username="staff", is_staff=True)
+        self.user = User.objects.create_user(email="user@example.com", password="pw", username="user")
+
+    def auth(self, user):
+        return {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(user).access_token}"}
+
+    def upload(self, name, content, user=None):
+        file = SimpleUploadedFile(name, content)
+        return self.client.post("/api/v1/products/import", {"file": file}, **self.auth(user or self.staff))
+
+
+@LOCAL_CACHE
+class ImportTests(StaffTestCase):
+    def test_ndjson_import_creates_and_updates_by_slug(self):
+        Product.objects.create(name="Apple", slug="apple", price=1)
+        rows = [
+            {"name": "Apple", "slug": "apple", "price": "2.50", "stock": 4, "category": "Fruit"},
+            {"name": "Pear", "price": "3", "brand": "Farm"},
+            {"name": "Bad", "price": "-1"},
+        ]
+        body = self.upload("products.ndjson", "\n".join(map(json.dumps, rows)).encode() + b"\nnot json\n").json()
+        self.assertEqual((body["created"], body["updated"], body["failed"]), (1, 1, 2))
+        self.assertEqual([error["row"] for error in body["errors"]], [3, 4])
+
+        apple = Product.objects.select_related("category").get(slug="apple")
+        self.assertEqual((str(apple.price), apple.stock, apple.category.name), ("2.50", 4, "Fruit"))
+        self.assertEqual(Product.objects.get(slug="pear").brand.name, "Farm")
+
+    def test_import_drops_the_fragments_of_updated_products(self):
+        product = Product.objects.create(name="Apple", slug="apple", price=1)
+        self.client.get(f"/api/v1/products/{product.pk}")
+        self.upload("products.csv", b"name,slug,price\nApple,apple,7\n")
+        self.assertEqual(self.client.get(f"/api/v1/products/{product.pk}").json()["price"], "7.00")
+
+    def test_import_is_staff_only(self):
+        self.assertEqual(self.upload("products.csv", b"name,price\nApple,1\n", user=self.user).status_code, 403)
+        self.assertFalse(Product.objects.exists())
+
+
+@LOCAL_CACHE
+class ExportTests(StaffTestCase):
+    async def collect(self, chunks):
+        return b"".join([chunk async for chunk in chunks])
+
+    def test_export_can_be_imported_back(self):
+        Product.objects.create(name="Apple", price="1.25", stock=2, category=Category.objects.create(name="Fruit"))
+        for format in ("ndjson", "csv"):
+            with self.subTest(format=format):
+                response = self.client.get(f"/api/v1/products/export?format={format}", **self.auth(self.staff))
+                self.assertEqual(response.status_code, 200)
+                body = self.upload(f"products.{format}", async_to_sync(self.collect)(response.streaming_content)).json()
+                self.assertEqual((body["created"], body["updated"], body["failed"]), (0, 1, 0))
+
+    def test_export_is_staff_only(self):
+        self.assertEqual(self.client.get("/api/v1/products/export", **self.auth(self.user)).status_code, 403)
+
+
+@LOCAL_CACHE
+class BulkUpdateTests(StaffTestCase):
+    def test_rows_update_by_id_or_slug(self):
+        apple = Product.objects.create(name="Apple", slug="apple", price=1)
+        pear = Product.objects.create(name="Pear", slug="pear", price=1, stock=5)
+        self.client.get(f"/api/v1/products/{apple.pk}")
+        items = [{"id": apple.pk, "price": "2"}, {"slug": "pear", "stock": 0}, {"slug": "nope", "stock": 1}, {"id": apple.pk, "price": "3"}]
+        response = self.client.patch("/api/v1/products", json.dumps({"items": items}), content_type="application/json", **self.auth(self.staff))
+
+        body = response.json()
+        self.assertEqual((body["updated"], body["not_found"]), (2, 1))
+        self.assertEqual([result["status"] for result in body["results"]], ["superseded", "updated", "not_found", "updated"])
+        self.assertEqual(self.client.get(f"/api/v1/products/{apple.pk}").json()["price"], "3.00")
+        self.assertEqual(Product.objects.get(pk=pear.pk).stock, 0)
+
+
+@LOCAL_CACHE
+class BatchGetTests(CatalogTestCase):
+    def test_products_by_id_or_slug_in_request_order(self):
+        apple = Product.objects.create(name="Apple", slug="apple", price=1)
+        pear = Product.objects.create(name="Pear", slug="pear", price=1)
+        body = self.client.get(f"/api/v1/products/batch?ids={pear.pk},0,{apple.pk},{pear.pk}").json()
+        self.assertEqual(([product["name"] for product in body["items"]], body["missing"]), (["Pear", "Apple"], [0]))
+        body = self.client.get("/api/v1/products/batch?slugs=apple,nope").json()
+        self.assertEqual(([product["name"] for product in body["items"]], body["missing"]), (["Apple"], ["nope"]))
+
+    def test_invalid_batches(self):
+        for query in ("", "?ids=1&slugs=a", "?ids=a", "?ids=" + ",".join(map(str, range(201)))):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f"/api/v1/products/batch{query}").status_code, 400)
@@ -36,12 +36,34 @@ echo "Started redis-server PID=${REDIS_PID}"
 GUNICORN_PID=$!
 echo "Started gunicorn PID=${GUNICORN_PID}"
 
+# Keep the nginx-served catalog snapshot current (rebuilt after catalog writes, debounced)
+python manage.py build_catalog_snapshot --watch &
+SNAPSHOT_PID=$!
+echo "Started catalog snapshot watcher PID=${SNAPSHOT_PID}"
+
+# Write Redis carts back to the database (only when they are kept in Redis)
+FLUSH_PID=""
+if [ "${CART_BACKEND:-db}" = "redis" ]; then
+  python manage.py flush_carts --watch &
+  FLUSH_PID=$!
+  echo "Started cart flusher PID=${FLUSH_PID}"
+fi
+
 # Graceful shutdown
 terminate() {
   echo "Received signal, stopping services..."
+  kill -TERM "$SNAPSHOT_PID" 2>/dev/null || true
   kill -TERM "$GUNICORN_PID" 2>/dev/null || true
+  if [ -n "$FLUSH_PID" ]; then
+    # once no more requests write carts, the flusher writes the pending ones on TERM, before Redis goes away
+    wait "$GUNICORN_PID" 2>/dev/null || true
+    kill -TERM "$FLUSH_PID" 2>/dev/null || true
+    wait "$FLUSH_PID" 2>/dev/null || true
+  fi
   kill -TERM "$REDIS_PID" 2>/dev/null || true
   sleep 5 || true
+  [ -n "$FLUSH_PID" ] && kill -KILL "$FLUSH_PID" 2>/dev/null || true
+  kill -KILL "$SNAPSHOT_PID" 2>/dev/null || true
   kill -KILL "$GUNICORN_PID" 2>/dev/null || true
   kill -KILL "$REDIS_PID" 2>/dev/null || true
 }
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Third-party
     'ninja',
@@ -219,7 +220,44 @@ CACHES = {
     }
 }
 
+# Seconds a cached catalog response is kept; entries are also invalidated on every catalog write
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 15 * 60))
+# Lower edges of the price bands counted by `GET /products/facets`, the last band is open-ended
+CATALOG_PRICE_BANDS = [0, 50, 100, 250, 500, 1000]
+# Autocomplete results are cached for prefixes up to this length
+CATALOG_SUGGEST_CACHED_PREFIX_LENGTH = int(os.getenv('CATALOG_SUGGEST_CACHED_PREFIX_LENGTH', 4))
+# Per-row errors returned by `POST /products/import` (the failed count is always complete)
+CATALOG_IMPORT_MAX_REPORTED_ERRORS = 1000
+# `GET /products/changes` only returns rows older than this, so writes still in flight are never skipped
+CATALOG_SYNC_LAG_SECONDS = int(os.getenv('CATALOG_SYNC_LAG_SECONDS', 30))
+# Deletions are remembered this long, older sync tokens get a 410 and clients re-download the catalog
+CATALOG_SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv('CATALOG_SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+# Pre-rendered catalog listings served by nginx (`manage.py build_catalog_snapshot`), and how often
+# the `--watch` mode checks for catalog writes (a burst of writes within it causes a single rebuild)
+CATALOG_SNAPSHOT_ROOT = os.getenv('CATALOG_SNAPSHOT_ROOT', BASE_DIR / 'snapshots')
+CATALOG_SNAPSHOT_DEBOUNCE_SECONDS = float(os.getenv('CATALOG_SNAPSHOT_DEBOUNCE_SECONDS', 5))
+# Co-purchased products kept per product by `manage.py build_product_recommendations`, and the
+# distinct products of an order that are paired (larger orders only add their first ones)
+PRODUCT_RECOMMENDATIONS_TOP_K = int(os.getenv('PRODUCT_RECOMMENDATIONS_TOP_K', 20))
+PRODUCT_RECOMMENDATIONS_MAX_ORDER_PRODUCTS = int(os.getenv('PRODUCT_RECOMMENDATIONS_MAX_ORDER_PRODUCTS', 50))
+# Daily product sales buckets are kept this many days (`manage.py compact_product_sales`), which is
+# also the longest `GET /products/trending` window; its responses are cached this many seconds
+PRODUCT_SALES_RETENTION_DAYS = int(os.getenv('PRODUCT_SALES_RETENTION_DAYS', 30))
+PRODUCT_TRENDING_CACHE_TIMEOUT = int(os.getenv('PRODUCT_TRENDING_CACHE_TIMEOUT', 5 * 60))
+# Where open carts live: "db" (`Cart`/`CartItem`) or "redis" (hashes at REDIS_URL, written back to
+# the database by `manage.py flush_carts --watch` every CART_FLUSH_INTERVAL_SECONDS and at checkout).
+# Redis carts expire after CART_REDIS_TTL_SECONDS without a write and are then reloaded from the database
+CART_BACKEND = os.getenv('CART_BACKEND', 'db')
+CART_REDIS_TTL_SECONDS = int(os.getenv('CART_REDIS_TTL_SECONDS', 7 * 24 * 60 * 60))
+CART_FLUSH_INTERVAL_SECONDS = float(os.getenv('CART_FLUSH_INTERVAL_SECONDS', 5))
+# Guest carts (`POST /guest-cart`, always in Redis) expire this long after their last write,
+# unless merged into the user's cart at login/signup before; and hold at most this many products
+GUEST_CART_TTL_SECONDS = int(os.getenv('GUEST_CART_TTL_SECONDS', 7 * 24 * 60 * 60))
+GUEST_CART_MAX_LINES = int(os.getenv('GUEST_CART_MAX_LINES', 100))
+
 # Default number of items in pagination for Ninja
 NINJA_PAGINATION_PER_PAGE = 10
 
-CACHALOT_ENABLED = os.getenv('ENABLE_CACHALOT', 'True') == 'True'
\ No newline at end of file
+CACHALOT_ENABLED = os.getenv('ENABLE_CACHALOT', 'True') == 'True'
+# `.iterator()` querysets (the streamed catalog export) must not be turned into one list and cached
+CACHALOT_CACHE_ITERATORS = False
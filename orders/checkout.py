@@ -0,0 +1,63 @@
+from typing import Optional, Tuple
+
+from django.db import transaction
+
+from carts.models import Cart
+from users.models import Address
+from .models import Order, OrderItem
+
+
+def place_order(user, address_id: Optional[int] = None) -> Tuple[Optional[Order], Optional[str]]:
+    """Build an order from the user's open cart and check the cart out, in one transaction.
+
+    Returns `(order, None)`, or `(None, error detail)` when there is no open cart or
+    address. The cart row stays locked until the order is committed, so a concurrent
+    Redis cart flush (`carts.store.flush_cart`) can't write the bought lines back.
+    """
+    with transaction.atomic():
+        # get the cart corresponding to the user
+        cart = (Cart.objects
+                .select_for_update(of=("self",))
+                .select_related("coupon")
+                .filter(user=user, status=Cart.STATUS_OPEN)
+                .first())
+        if not cart:
+            return None, "No open cart found"
+
+        if address_id:
+            address = Address.objects.filter(id=address_id, user=user).first()
+            if not address:
+                return None, f"User {user.username} has no address with this id"
+        else:
+            address = Address.objects.filter(is_default=True, user=user).first()
+            if not address:
+                return None, f"User {user.username} has no assigned addresses"
+
+        items = list(cart.items.select_related("product"))
+        discount_amount = cart.discount_for(sum(item.product.price * item.quantity for item in items))
+
+        # Create order
+        order = Order.objects.create(
+            user=user,
+            address=address,
+            status=Order.STATUS_PENDING,
+            coupon_code=cart.coupon.code if discount_amount > 0 else None,
+            discount_amount=discount_amount,
+        )
+        order_items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=cart_item.product,
+                product_name=cart_item.product.name,
+                unit_price=cart_item.product.price,
+                quantity=cart_item.quantity,
+            ) for cart_item in items
+        ])
+
+        # Mark cart as checked out
+        cart.status = Cart.STATUS_CHECKED_OUT
+        cart.save()
+
+    # we need to prefetch the items
+    order._prefetched_objects_cache = {"items": order_items}
+    return order, None
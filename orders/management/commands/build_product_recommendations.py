@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.recommendations import build_product_recommendations
+
+
+class Command(BaseCommand):
+    help = "Count the product pairs of sold orders not counted yet and refresh the co-purchase top lists."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="orders per transaction")
+
+    def handle(self, *args, batch_size, **options):
+        counted = build_product_recommendations(batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Counted {counted} order(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orders.rankings import compact_product_sales
+
+
+class Command(BaseCommand):
+    help = "Delete daily product sales buckets older than PRODUCT_SALES_RETENTION_DAYS (no ranking window reaches them)."
+
+    def handle(self, *args, **options):
+        deleted = compact_product_sales()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} sales bucket(s)."))
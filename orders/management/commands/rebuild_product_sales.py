@@ -0,0 +1,16 @@
+from cachalot.api import invalidate
+from django.core.management.base import BaseCommand
+
+from catalog.models import Product
+from orders.models import ProductSalesDay
+from orders.rankings import rebuild_product_sales
+
+
+class Command(BaseCommand):
+    help = "Recompute product sales counts and the retained daily sales buckets from the order history."
+
+    def handle(self, *args, **options):
+        fixed = rebuild_product_sales()
+        # raw writes, cachalot has to be told
+        invalidate(Product, ProductSalesDay)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt product sales, {fixed} product(s) had a wrong sales count."))
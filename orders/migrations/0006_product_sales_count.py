@@ -0,0 +1,88 @@
+# Generated by Django 5.2 on 2026-10-17 18:45
+
+from django.db import migrations
+
+
+# statuses whose items count as sold
+SOLD_STATUSES = "('paid', 'shipped', 'delivered')"
+
+BACKFILL_SQL = rf"""
+WITH sales AS (
+    SELECT i.product_id, SUM(i.quantity) AS sales_count
+    FROM orders_orderitem AS i
+    JOIN orders_order AS o ON o.id = i.order_id
+    WHERE o.status IN {SOLD_STATUSES} AND i.product_id IS NOT NULL
+    GROUP BY i.product_id
+)
+UPDATE catalog_product AS p
+SET sales_count = sales.sales_count
+FROM sales
+WHERE sales.product_id = p.id;
+"""
+
+
+CREATE_FUNCTION_SQL = rf"""
+-- Function: add the items of an order entering a sold status to their products' sales_count,
+-- and take them back when it leaves one (e.g. a paid order being canceled)
+CREATE OR REPLACE FUNCTION orders_count_product_sales()
+RETURNS trigger AS $$
+DECLARE
+    delta integer;
+BEGIN
+    IF NEW.status IN {SOLD_STATUSES} AND OLD.status NOT IN {SOLD_STATUSES} THEN
+        delta := 1;
+    ELSIF OLD.status IN {SOLD_STATUSES} AND NEW.status NOT IN {SOLD_STATUSES} THEN
+        delta := -1;
+    ELSE
+        RETURN NULL;
+    END IF;
+
+    UPDATE catalog_product AS p
+    SET sales_count = p.sales_count + delta * sold.quantity
+    FROM (
+        SELECT product_id, SUM(quantity) AS quantity
+        FROM orders_orderitem
+        WHERE order_id = NEW.id AND product_id IS NOT NULL
+        GROUP BY product_id
+    ) AS sold
+    WHERE p.id = sold.product_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+CREATE_TRIGGER_SQL = r"""
+-- Trigger on orders_order AFTER UPDATE OF status
+DROP TRIGGER IF EXISTS trg_orders_count_product_sales ON orders_order;
+CREATE TRIGGER trg_orders_count_product_sales
+AFTER UPDATE OF status ON orders_order
+FOR EACH ROW
+WHEN (OLD.status IS DISTINCT FROM NEW.status)
+EXECUTE FUNCTION orders_count_product_sales();
+"""
+
+
+DROP_TRIGGER_SQL = r"""
+DROP TRIGGER IF EXISTS trg_orders_count_product_sales ON orders_order;
+"""
+
+
+DROP_FUNCTION_SQL = r"""
+DROP FUNCTION IF EXISTS orders_count_product_sales();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_address_nullable_only_when_delivered_or_canceled'),
+        ('catalog', '0006_listing_sorts'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=BACKFILL_SQL + CREATE_FUNCTION_SQL + CREATE_TRIGGER_SQL,
+            reverse_sql=DROP_TRIGGER_SQL + DROP_FUNCTION_SQL,
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2 on 2026-10-17 18:42
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+previous = import_module('orders.migrations.0006_product_sales_count')
+
+SOLD_STATUSES = previous.SOLD_STATUSES
+
+# same transitions as before, the units now also land in the (UTC) day bucket of the transition
+CREATE_FUNCTION_SQL = rf"""
+CREATE OR REPLACE FUNCTION orders_count_product_sales()
+RETURNS trigger AS $$
+DECLARE
+    delta integer;
+BEGIN
+    IF NEW.status IN {SOLD_STATUSES} AND OLD.status NOT IN {SOLD_STATUSES} THEN
+        delta := 1;
+    ELSIF OLD.status IN {SOLD_STATUSES} AND NEW.status NOT IN {SOLD_STATUSES} THEN
+        delta := -1;
+    ELSE
+        RETURN NULL;
+    END IF;
+
+    WITH sold AS (
+        SELECT product_id, SUM(quantity) AS quantity
+        FROM orders_orderitem
+        WHERE order_id = NEW.id AND product_id IS NOT NULL
+        GROUP BY product_id
+    ), counted AS (
+        UPDATE catalog_product AS p
+        SET sales_count = p.sales_count + delta * sold.quantity
+        FROM sold
+        WHERE p.id = sold.product_id
+    )
+    INSERT INTO orders_productsalesday (product_id, day, quantity)
+    SELECT product_id, (now() AT TIME ZONE 'UTC')::date, delta * quantity
+    FROM sold
+    ON CONFLICT (product_id, day) DO UPDATE SET quantity = orders_productsalesday.quantity + EXCLUDED.quantity;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_listing_sorts'),
+        ('orders', '0007_product_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='orders_sales_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='unique_product_sales_day')],
+            },
+        ),
+        migrations.RunSQL(
+            sql=CREATE_FUNCTION_SQL,
+            reverse_sql=previous.CREATE_FUNCTION_SQL,
+        ),
+    ]
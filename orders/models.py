@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.db import models
+from django.contrib.postgres.fields import ArrayField
 from django.db.models import F, Sum
 
 from users.models import Address
@@ -20,6 +21,8 @@ class Order(models.Model):
         (STATUS_DELIVERED, 'Delivered'),
         (STATUS_CANCELED, 'Canceled'),
     ]
+    # statuses whose items count as sold
+    SOLD_STATUSES = (STATUS_PAID, STATUS_SHIPPED, STATUS_DELIVERED)
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='orders')
     address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True)
@@ -32,6 +35,9 @@ class Order(models.Model):
 
     stripe_session_id = models.CharField(max_length=255, blank=True)
 
+    # set once the items were added to `ProductCoPurchase` (see `orders.recommendations`)
+    co_purchases_counted = models.BooleanField(default=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -48,6 +54,11 @@ class Order(models.Model):
             ),
         ]
         ordering = ['-created_at']
+        indexes = [
+            # sold orders still to be counted by `orders.recommendations`
+            models.Index(fields=['id'], name='orders_uncounted_sold_idx',
+                         condition=models.Q(co_purchases_counted=False, status__in=['paid', 'shipped', 'delivered'])),
+        ]
 
     def items_total(self):
         # return OrderItem.objects.filter(order=self).aggregate(total=Sum(F('unit_price') * F('quantity'), default=0))['total']
@@ -79,3 +90,45 @@ class OrderItem(models.Model):
 
     def __str__(self) -> str:
         return f"{self.quantity} x {self.product_name}"
+
+
+class ProductCoPurchase(models.Model):
+    """How many sold orders contained both products, stored in both directions."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='unique_product_co_purchase'),
+        ]
+        indexes = [
+            models.Index(fields=['product', '-count', 'other'], name='orders_co_purchase_top_idx'),
+        ]
+
+
+class ProductRecommendation(models.Model):
+    """Top co-purchased products of a product, most frequent first, read by `GET /products/{id}/related`."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    related_ids = ArrayField(models.BigIntegerField(), default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class ProductSalesDay(models.Model):
+    """Units of a product sold on a (UTC) day, kept by the `orders_count_product_sales` trigger.
+
+    Canceling a sold order subtracts its units from the day it is canceled on.
+    Buckets older than `PRODUCT_SALES_RETENTION_DAYS` are dropped by
+    `manage.py compact_product_sales`.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='unique_product_sales_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='orders_sales_day_idx'),
+        ]
@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Order, ProductSalesDay
+
+
+def sales_window_start(days: int) -> date:
+    """First (UTC) day of a window of `days` days ending today."""
+    return timezone.now().date() - timedelta(days=days - 1)
+
+
+async def atrending_product_ids(days: int, limit: int, category_id: Optional[int] = None) -> List[int]:
+    """Active products with the most units sold over the last `days` days, from the daily buckets."""
+    qs = ProductSalesDay.objects.filter(day__gte=sales_window_start(days), product__is_active=True)
+    if category_id is not None:
+        qs = qs.filter(product__category_id=category_id)
+    qs = qs.values("product_id").annotate(sold=Sum("quantity")).filter(sold__gt=0).order_by("-sold", "product_id")
+    return [row["product_id"] async for row in qs[:limit]]
+
+
+def compact_product_sales() -> int:
+    """Drop the buckets older than `PRODUCT_SALES_RETENTION_DAYS`, return how many were deleted."""
+    deleted, _ = ProductSalesDay.objects.filter(day__lt=sales_window_start(settings.PRODUCT_SALES_RETENTION_DAYS)).delete()
+    return deleted
+
+
+def rebuild_product_sales() -> int:
+    """Recompute `Product.sales_count` and the retained day buckets from the order history.
+
+    An order's units are bucketed on the day it was paid (its payment creation,
+    or its last update when it has no payment). Returns the number of products
+    whose `sales_count` was out of date.
+    """
+    from payments.models import Payment
+
+    params = {
+        "sold": list(Order.SOLD_STATUSES),
+        "since": sales_window_start(settings.PRODUCT_SALES_RETENTION_DAYS),
+    }
+    with transaction.atomic(), connection.cursor() as cursor:
+        # block order status changes so no trigger delta lands between the scans and the writes
+        cursor.execute("LOCK TABLE orders_order IN SHARE MODE")
+        cursor.execute("""
+            WITH sales AS (
+                SELECT p.id AS product_id, COALESCE(SUM(i.quantity) FILTER (WHERE o.status = ANY(%(sold)s)), 0) AS sales_count
+                FROM catalog_product AS p
+                LEFT JOIN orders_orderitem AS i ON i.product_id = p.id
+                LEFT JOIN orders_order AS o ON o.id = i.order_id
+                GROUP BY p.id
+            )
+            UPDATE catalog_product AS p
+            SET sales_count = sales.sales_count
+            FROM sales
+            WHERE sales.product_id = p.id AND p.sales_count <> sales.sales_count
+        """, params)
+        fixed = cursor.rowcount
+
+        cursor.execute("DELETE FROM orders_productsalesday WHERE day >= %(since)s", params)
+        cursor.execute(f"""
+            INSERT INTO orders_productsalesday (product_id, day, quantity)
+            SELECT i.product_id, (COALESCE(pay.created_at, o.updated_at) AT TIME ZONE 'UTC')::date AS day, SUM(i.quantity)
+            FROM orders_orderitem AS i
+            JOIN orders_order AS o ON o.id = i.order_id
+            LEFT JOIN {Payment._meta.db_table} AS pay ON pay.order_id = o.id
+            WHERE o.status = ANY(%(sold)s) AND i.product_id IS NOT NULL
+              AND (COALESCE(pay.created_at, o.updated_at) AT TIME ZONE 'UTC')::date >= %(since)s
+            GROUP BY 1, 2
+        """, params)
+    return fixed
@@ -0,0 +1,89 @@
+from collections import Counter
+from itertools import permutations
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from catalog.models import Product
+from .models import Order, OrderItem, ProductCoPurchase, ProductRecommendation
+
+
+# adds a batch of pair counts, `unnest` keeps it a single statement whatever the batch size
+UPSERT_PAIRS_SQL = f"""
+INSERT INTO {ProductCoPurchase._meta.db_table} (product_id, other_id, count)
+SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::integer[])
+ON CONFLICT (product_id, other_id) DO UPDATE SET count = {ProductCoPurchase._meta.db_table}.count + EXCLUDED.count
+"""
+
+# rewrites the top-K lists of the given products from their pair counts
+REFRESH_TOP_SQL = f"""
+INSERT INTO {ProductRecommendation._meta.db_table} (product_id, related_ids, updated_at)
+SELECT product_id, (array_agg(other_id ORDER BY count DESC, other_id))[1:%s], now()
+FROM {ProductCoPurchase._meta.db_table}
+WHERE product_id = ANY(%s)
+GROUP BY product_id
+ON CONFLICT (product_id) DO UPDATE SET related_ids = EXCLUDED.related_ids, updated_at = EXCLUDED.updated_at
+"""
+
+
+def count_order_batch(batch_size: int) -> int:
+    """Add the product pairs of up to `batch_size` uncounted sold orders, return how many were counted.
+
+    Orders are locked with `SKIP LOCKED` and flagged in the same transaction, so each
+    one is counted exactly once even with concurrent runs.
+    """
+    with transaction.atomic():
+        order_ids = list(
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(co_purchases_counted=False, status__in=Order.SOLD_STATUSES)
+            .order_by("id").values_list("id", flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return 0
+
+        baskets = {}
+        for order_id, product_id in OrderItem.objects.filter(order_id__in=order_ids, product__isnull=False).values_list("order_id", "product_id"):
+            baskets.setdefault(order_id, set()).add(product_id)
+
+        pairs = Counter()
+        for products in baskets.values():
+            # a bulk order would add n² pairs of little value, only its first products are counted
+            products = sorted(products)[:settings.PRODUCT_RECOMMENDATIONS_MAX_ORDER_PRODUCTS]
+            pairs.update(permutations(products, 2))
+
+        if pairs:
+            (product_ids, other_ids), counts = zip(*pairs.keys()), list(pairs.values())
+            with connection.cursor() as cursor:
+                cursor.execute(UPSERT_PAIRS_SQL, [list(product_ids), list(other_ids), counts])
+                cursor.execute(REFRESH_TOP_SQL, [settings.PRODUCT_RECOMMENDATIONS_TOP_K, sorted(set(product_ids))])
+
+        Order.objects.filter(id__in=order_ids).update(co_purchases_counted=True)
+        return len(order_ids)
+
+
+def build_product_recommendations(batch_size: int = 1000) -> int:
+    """Count every sold order not counted yet, in batches, and return how many were counted.
+
+    Only the products of the new orders get their top-K list recomputed, so a run
+    costs in proportion to the orders sold since the previous one.
+    """
+    total = 0
+    while counted := count_order_batch(batch_size):
+        total += counted
+    return total
+
+
+async def aget_related_product_ids(product_id: int, category_id: Optional[int], limit: int) -> List[int]:
+    """Most co-purchased active products, topped up with the best sellers of `category_id`."""
+    related = await ProductRecommendation.objects.filter(product_id=product_id).values_list("related_ids", flat=True).afirst() or []
+    # lists are rebuilt in batches, products deactivated since then are skipped
+    active = {pk async for pk in Product.objects.filter(id__in=related, is_active=True).values_list("id", flat=True)} if related else set()
+    product_ids = [pk for pk in related if pk in active][:limit]
+
+    if len(product_ids) < limit and category_id is not None:
+        best_sellers = Product.objects.filter(category_id=category_id, is_active=True) \
+                                      .exclude(id__in=[product_id, *product_ids]) \
+                                      .order_by("-sales_count", "-id").values_list("id", flat=True)
+        product_ids += [pk async for pk in best_sellers[:limit - len(product_ids)]]
+    return product_ids
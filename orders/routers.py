@@ -1,32 +1,76 @@
-from typing import List, Optional
+from typing import List, Optional, Union
 from asgiref.sync import sync_to_async
-from ninja import Router
+from ninja import Router, Query
 from ninja_jwt.authentication import AsyncJWTAuth
 from django.http import Http404
 from decimal import Decimal
 
-from .models import Order, OrderItem
-from .schemas import OrderCreateIn, OrderOut, OrderItemOut
+from .models import Order
+from .checkout import place_order
+from .schemas import OrderCreateIn, OrderOut, OrderItemOut, OrderPageOut
 
-from carts.models import Cart
-from users.models import Address
+from carts.store import cart_store
+from users.schemas import AddressOut
+from catalog.fragments import dumps, json_response
 
 from base.schemas import ErrorSchema
+from base.pagination import KeysetPagination
+from base.fieldsets import FieldsetQuery
 
 router = Router(auth=AsyncJWTAuth(), tags=["orders"])
 
 
-async def serialize_order(order: Order) -> OrderOut:
-    items = await sync_to_async(list)(order.items.all())
-    return OrderOut(
-        id=order.id,
-        status=order.status,
-        total_amount=order.total,
-        address=order.address,
-        address_text=order.address.get_formatted_address(),
-        coupon_code=order.coupon_code,
-        discount_amount=order.discount_amount,
-        items=[
+ORDER_RELATIONS = ("address", "items")
+
+# what each `OrderOut` field is built from: order columns, `address` (joined) and `items` (prefetched)
+ORDER_FIELD_SOURCES = {
+    "id": [],
+    "status": ["status"],
+    "total_amount": ["discount_amount", "items"],
+    "address": ["address"],
+    "address_text": ["address"],
+    "coupon_code": ["coupon_code"],
+    "discount_amount": ["discount_amount"],
+    "items": ["items"],
+}
+
+
+def order_fieldset(fieldset: FieldsetQuery):
+    return fieldset.resolve(OrderOut.model_fields, ORDER_RELATIONS)
+
+
+def order_queryset(qs, selected=None):
+    """Load, join and prefetch only what the `selected` `OrderOut` fields are built from."""
+    if selected is None:
+        return qs.select_related("address").prefetch_related("items")
+
+    sources = {source for name in selected for source in ORDER_FIELD_SOURCES[name]}
+    # `created_at` is the pagination key
+    qs = qs.only("id", "created_at", *(source for source in sources if source != "items"))
+    if "address" in sources:
+        qs = qs.select_related("address")
+    if "items" in sources:
+        qs = qs.prefetch_related("items")
+    return qs
+
+
+async def serialize_order(order: Order, selected=None):
+    """The `OrderOut` of an order, or for a sparse fieldset a dict of the `selected` fields.
+
+    A sparse order can't be validated as an `OrderOut` (its fields are required),
+    the routes render it themselves.
+    """
+    sources = None if selected is None else {source for name in selected for source in ORDER_FIELD_SOURCES[name]}
+    items = await sync_to_async(list)(order.items.all()) if sources is None or "items" in sources else []
+    fields = {
+        "id": lambda: order.id,
+        "status": lambda: order.status,
+        "total_amount": lambda: order.total,
+        "address": lambda: AddressOut.from_orm(order.address) if order.address else None,
+        "address_text": lambda: order.address.get_formatted_address(),
+        "coupon_code": lambda: order.coupon_code,
+        "discount_amount": lambda: order.discount_amount,
+        "items": lambda: [
             OrderItemOut(
                 product_id=it.product_id,
                 product_name=it.product_name,
@@ -36,92 +80,59 @@ async def serialize_order(order: Order) -> OrderOut:
             )
             for it in items
         ],
-    )
+    }
+    if selected is None:
+        return OrderOut(**{name: value() for name, value in fields.items()})
+    return OrderOut.model_construct(**{name: value() for name, value in fields.items() if name in selected}).model_dump(include=selected)
 
 
-@router.get("/orders", response=List[OrderOut])
-async def list_orders(request):
-    qs = Order.objects.filter(user=request.user).select_related("address").prefetch_related("items", "items__product")
-    orders = await sync_to_async(list)(qs)
-    result: List[OrderOut] = []
-    for order in orders:
-        result.append(await serialize_order(order))
-    return result
+class OrderPagination(KeysetPagination):
+    """Paginates the orders queryset, then builds the `OrderOut` of each order in the page."""
+
+    async def apaginate_queryset(self, queryset, pagination, request, selected=None, **params):
+        page = await super().apaginate_queryset(queryset, pagination, request, **params)
+        page[self.items_attribute] = [await serialize_order(order, selected) for order in page[self.items_attribute]]
+        return page
+
+
+order_pagination = OrderPagination()
+
+
+@router.get("/orders", response=Union[List[OrderOut], OrderPageOut])
+async def list_orders(request, pagination: Query[KeysetPagination.CursorInput], fieldset: Query[FieldsetQuery]):
+    """Every order of the user, or with `cursor=` (empty for the first page) a keyset page of them."""
+    selected = order_fieldset(fieldset)
+    qs = order_queryset(Order.objects.filter(user=request.user), selected)
+    if pagination.cursor is None:
+        orders = [await serialize_order(order, selected) async for order in qs]
+        return orders if selected is None else json_response(dumps(orders))
+
+    page = await order_pagination.apaginate_queryset(qs, pagination, request, selected)
+    if selected is None:
+        return page
+    return json_response(dumps({"items": page["items"], "count": page["count"], "next_cursor": page.get("next_cursor")}))
 
 
 @router.post("/orders", response={200: OrderOut, 400: ErrorSchema})
 async def create_order(request, payload: Optional[OrderCreateIn] = None):
 
-    # get the cart corresponding to the user
-    cart = await (Cart.objects
-                  .select_related("coupon")
-                  .prefetch_related('items', 'items__product')
-                  .filter(user=request.user, status=Cart.STATUS_OPEN)
-                  .afirst())
-    if not cart:
-        return 400, {"detail": "No open cart found"}
-
-    # Calculate totals
-    # subtotal = cart.subtotal()
-    discount_amount = cart.discount_amount()
-    total = cart.total()
-
-    # checking coupon
-    coupon_code = None
-    if discount_amount > 0:
-        coupon_code = cart.coupon.code
-
-    if payload:
-        if payload.address_id:
-            address = await Address.objects.filter(id=payload.address_id, user=request.user).afirst()
-            if not address:
-                return 400, {"detail": f"User {request.user.username} has no address with this id"}
-        else:
-            address = await Address.objects.filter(is_default=True, user=request.user).afirst()
-            if not address:
-                return 400, {"detail": f"User {request.user.username} has no assigned addresses"}
-    else:
-        address = await Address.objects.filter(is_default=True, user=request.user).afirst()
-        if not address:
-            return 400, {"detail": f"User {request.user.username} has no assigned addresses"}
-
-
-    # Create order
-    order = Order(
-        user=request.user,
-        address=address,
-        status=Order.STATUS_PENDING,
-        coupon_code=coupon_code,
-        discount_amount=discount_amount,
-    )
-    await order.asave()
-
-    # Create order items
-    items = await sync_to_async(list)(cart.items.select_related("product").all())
-    order_items_objs = [
-        OrderItem(
-            order=order,
-            product=cart_item.product,
-            product_name=cart_item.product.name,
-            unit_price=cart_item.product.price,
-            quantity=cart_item.quantity,
-        ) for cart_item in items
-    ]
-
-    await order.items.abulk_create(order_items_objs)
-
-    # Mark cart as checked out
-    cart.status = Cart.STATUS_CHECKED_OUT
-    await cart.asave()
-
-    # we need to prefetch the items
-    order._prefetched_objects_cache = {"items": order_items_objs}
+    # carts kept outside the database are written back first, the order is built from the rows
+    store = cart_store()
+    await store.aflush(request.user)
+    try:
+        order, error = await sync_to_async(place_order)(request.user, payload.address_id if payload else None)
+    finally:
+        await store.adiscard(request.user)
+    if error:
+        return 400, {"detail": error}
     return await serialize_order(order)
 
 
 @router.get("/orders/{order_id}", response=OrderOut)
-async def get_order(request, order_id: int):
-    order = await Order.objects.filter(pk=order_id, user=request.user).select_related("address").prefetch_related("items", "items__product").afirst()
+async def get_order(request, order_id: int, fieldset: Query[FieldsetQuery]):
+    selected = order_fieldset(fieldset)
+    order = await order_queryset(Order.objects.filter(pk=order_id, user=request.user), selected).afirst()
     if not order:
         raise Http404("Order not found")
-    return await serialize_order(order)
+    order = await serialize_order(order, selected)
+    return order if selected is None else json_response(dumps(order))
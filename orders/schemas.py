@@ -26,3 +26,10 @@ class OrderOut(Schema):
     coupon_code: Optional[str] = None
     discount_amount: Decimal
     items: List[OrderItemOut]
+
+
+# `GET /orders` page, `KeysetPagination` output
+class OrderPageOut(Schema):
+    items: List[OrderOut]
+    count: Optional[int] = None
+    next_cursor: Optional[str] = None
@@ -0,0 +1,17 @@
+from cachalot.api import invalidate
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from catalog.models import Product
+from .models import Order, ProductSalesDay
+
+
+# statuses whose transitions fire the `orders_count_product_sales` trigger
+SALES_STATUSES = (*Order.SOLD_STATUSES, Order.STATUS_CANCELED)
+
+
+@receiver(post_save, sender=Order, dispatch_uid="invalidate_products_on_order_status")
+def invalidate_products_on_order_status(sender, instance, created, **kwargs):
+    # cachalot can't see the trigger updating `Product.sales_count` and the daily sales buckets
+    if not created and instance.status in SALES_STATUSES:
+        invalidate(Product, ProductSalesDay)
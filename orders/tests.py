@@ -0,0 +1,125 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from ninja_jwt.tokens import RefreshToken
+
+from catalog.models import Category, Product
+from users.models import Address, User
+from .models import Order, OrderItem, ProductSalesDay
+from .rankings import rebuild_product_sales, sales_window_start
+from .recommendations import build_product_recommendations
+
+
+class OrderListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="user@example.com", password="pw", username="user")
+        address = Address.objects.create(user=self.user, line1="Street", city="Cairo", phone_number="01012345678", is_default=True)
+        self.orders = [Order.objects.create(user=self.user, address=address) for _ in range(5)]
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def test_without_cursor_every_order_is_listed(self):
+        for query in ("", "?fields=id,status"):
+            with self.subTest(query=query):
+                body = self.client.get(f"/api/v1/orders{query}", **self.auth).json()
+                self.assertIsInstance(body, list)
+                self.assertEqual(sorted(order["id"] for order in body), [order.pk for order in self.orders])
+
+    def test_cursor_pages_cover_every_order_once(self):
+        ids, cursor = [], ""
+        while cursor is not None:
+            body = self.client.get(f"/api/v1/orders?limit=2&cursor={cursor}", **self.auth).json()
+            self.assertLessEqual(len(body["items"]), 2)
+            ids += [order["id"] for order in body["items"]]
+            cursor = body["next_cursor"]
+        self.assertEqual(sorted(ids), [order.pk for order in self.orders])
+        self.assertEqual(len(ids), len(set(ids)))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}, CACHALOT_ENABLED=False)
+class SoldOrdersTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="user@example.com", password="pw", username="user")
+        self.address = Address.objects.create(user=self.user, line1="Street", city="Cairo", phone_number="01012345678", is_default=True)
+        self.category = Category.objects.create(name="Fruit")
+        self.products = [Product.objects.create(name=f"P{i}", price=1, category=self.category) for i in range(4)]
+
+    def sell(self, *lines):
+        """A paid order of `(product, quantity)` lines, the status change fires the sales trigger."""
+        order = Order.objects.create(user=self.user, address=self.address)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, product_name=product.name, unit_price=product.price, quantity=quantity)
+            for product, quantity in lines
+        ])
+        Order.objects.filter(pk=order.pk).update(status=Order.STATUS_PAID)
+        return order
+
+    def names(self, path):
+        return [product["name"] for product in self.client.get(path).json()]
+
+
+class RecommendationTests(SoldOrdersTestCase):
+    def test_co_purchases_are_counted_once_per_sold_order(self):
+        p0, p1, p2, p3 = self.products
+        self.sell((p0, 1), (p1, 1))
+        self.sell((p0, 1), (p1, 3))
+        self.sell((p0, 1), (p2, 1))
+        Order.objects.create(user=self.user, address=self.address).items.create(product=p3, product_name=p3.name, unit_price=1, quantity=1)
+
+        self.assertEqual(build_product_recommendations(batch_size=2), 3)
+        self.assertEqual(build_product_recommendations(), 0)
+        self.assertEqual(self.names(f"/api/v1/products/{p0.pk}/related?limit=2"), ["P1", "P2"])
+        self.assertEqual(self.names(f"/api/v1/products/{p2.pk}/related?limit=1"), ["P0"])
+
+    def test_inactive_products_are_skipped_and_the_list_topped_up_from_the_category(self):
+        p0, p1, p2, p3 = self.products
+        self.sell((p0, 1), (p1, 1))
+        self.sell((p2, 2))
+        build_product_recommendations()
+        p1.is_active = False
+        p1.save()
+        # P2 is the category's best seller, P0 itself is never listed
+        self.assertEqual(self.names(f"/api/v1/products/{p0.pk}/related?limit=2"), ["P2", "P3"])
+
+
+class SalesRankingTests(SoldOrdersTestCase):
+    def trending(self, query=""):
+        # trending listings are cached for a while rather than invalidated on every sale
+        cache.clear()
+        return self.names(f"/api/v1/products/trending{query}")
+
+    def sales_counts(self):
+        return list(Product.objects.order_by("id").values_list("sales_count", flat=True))
+
+    def test_paying_and_canceling_keep_the_counts_and_day_buckets_in_step(self):
+        p0, p1, *_ = self.products
+        self.sell((p0, 2))
+        order = self.sell((p1, 5))
+        self.assertEqual(self.sales_counts(), [2, 5, 0, 0])
+        self.assertEqual(self.trending(), ["P1", "P0"])
+        listing = self.client.get("/api/v1/products?sort=best_selling").json()["items"]
+        self.assertEqual([product["name"] for product in listing], ["P1", "P0", "P3", "P2"])
+
+        order.status = Order.STATUS_CANCELED
+        order.save()
+        self.assertEqual(self.sales_counts(), [2, 0, 0, 0])
+        self.assertEqual(self.trending(), ["P0"])
+
+    def test_trending_window_and_category(self):
+        p0, p1, *_ = self.products
+        self.sell((p0, 1))
+        ProductSalesDay.objects.create(product=p1, day=sales_window_start(7) - timedelta(days=1), quantity=10)
+        self.assertEqual(self.trending("?days=7"), ["P0"])
+        self.assertEqual(self.trending("?days=8"), ["P1", "P0"])
+        self.assertEqual(self.trending(f"?category={Category.objects.create(name='Dairy').pk}"), [])
+
+    def test_rebuild_repairs_drifted_counts(self):
+        p0, *_ = self.products
+        self.sell((p0, 3))
+        Product.objects.filter(pk=p0.pk).update(sales_count=100)
+        ProductSalesDay.objects.all().delete()
+
+        self.assertEqual(rebuild_product_sales(), 1)
+        self.assertEqual(self.sales_counts(), [3, 0, 0, 0])
+        self.assertEqual(list(ProductSalesDay.objects.values_list("product_id", "quantity")), [(p0.pk, 3)])
@@ -1,25 +1,32 @@
-from typing import List
+from typing import List, Union
 from asgiref.sync import sync_to_async
 
 from django.http import Http404
 from django.shortcuts import aget_object_or_404
 from django.contrib.auth import get_user_model
 
-from ninja import Router, PatchDict
+from ninja import Router, PatchDict, Query
 from ninja_jwt.authentication import AsyncJWTAuth
 
+from base.pagination import KeysetPagination
+
 from .models import Address
-from .schemas import AddressIn, AddressOut
+from .schemas import AddressIn, AddressOut, AddressPageOut
 
 router = Router(tags=["Addresses"], auth=AsyncJWTAuth())
 
+address_pagination = KeysetPagination()
+
 
-@router.get("/addresses", response=List[AddressOut])
-async def get_user_addresses(request):
-    """Get all addresses for the authenticated user"""
+@router.get("/addresses", response=Union[List[AddressOut], AddressPageOut])
+async def get_user_addresses(request, pagination: Query[KeysetPagination.CursorInput]):
+    """Get all addresses for the authenticated user, or with `cursor=` (empty for the first page) a keyset page of them"""
     user = request.user
     addresses = Address.objects.filter(user=user).all()
-    return await sync_to_async(list)(addresses)
+    if pagination.cursor is None:
+        return await sync_to_async(list)(addresses)
+    # the default ordering has no unique key to seek on, pages go from the newest address
+    return await address_pagination.apaginate_queryset(addresses.order_by("-id"), pagination, request)
 
 
 @router.post("/addresses", response=AddressOut)
@@ -12,6 +12,7 @@ from ninja_jwt.tokens import RefreshToken
 from ninja_jwt.authentication import AsyncJWTAuth
 
 from base.schemas import ErrorSchema
+from carts.guest import amerge_guest_cart
 from .schemas import SignupIn, LoginIn, TokenOut, PasswordChangeIn, PasswordForgotIn, PasswordResetIn
 
 User = get_user_model()
@@ -27,6 +28,8 @@ async def signup(request, payload: SignupIn):
         email=payload.email,
         password=payload.password,
     )
+    if payload.guest_cart:
+        await amerge_guest_cart(user, payload.guest_cart)
     refresh = RefreshToken.for_user(user)
     return TokenOut(access=str(refresh.access_token), refresh=str(refresh))
 
@@ -36,6 +39,8 @@ async def login(request, payload: LoginIn):
     user = await aauthenticate(request, email=payload.email, password=payload.password)
     if not user:
         return 401, {"detail": "Invalid credentials"}
+    if payload.guest_cart:
+        await amerge_guest_cart(user, payload.guest_cart)
     refresh = RefreshToken.for_user(user)
     return TokenOut(access=str(refresh.access_token), refresh=str(refresh))
 
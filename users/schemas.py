@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from ninja import Schema, ModelSchema
 from datetime import datetime
 from .models import Address
@@ -16,15 +16,24 @@ class AddressOut(ModelSchema):
         exclude = ['user']
 
 
+# `GET /addresses` page, `KeysetPagination` output
+class AddressPageOut(Schema):
+    items: List[AddressOut]
+    count: Optional[int] = None
+    next_cursor: Optional[str] = None
+
+
 class SignupIn(Schema):
     username: str
     email: str
     password: str
+    guest_cart: Optional[str] = None  # token of a guest cart to merge into the user's cart
 
 
 class LoginIn(Schema):
     email: str
     password: str
+    guest_cart: Optional[str] = None  # token of a guest cart to merge into the user's cart
 
 
 class TokenOut(Schema):
@@ -0,0 +1,33 @@
+from django.test import TestCase
+from ninja_jwt.tokens import RefreshToken
+
+from base.pagination import KeysetPagination
+from .models import Address, User
+
+
+class AddressListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="user@example.com", password="pw", username="user")
+        self.addresses = [
+            Address.objects.create(user=self.user, line1=f"Street {i}", city="Cairo", phone_number="01012345678", is_default=i == 0)
+            for i in range(5)
+        ]
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def test_without_cursor_every_address_is_listed(self):
+        body = self.client.get("/api/v1/addresses", **self.auth).json()
+        self.assertIsInstance(body, list)
+        self.assertEqual(body[0]["id"], self.addresses[0].pk)
+        self.assertEqual(len(body), 5)
+
+    def test_cursor_pages_go_from_the_newest_address(self):
+        ids, cursor = [], ""
+        while cursor is not None:
+            body = self.client.get(f"/api/v1/addresses?limit=2&cursor={cursor}", **self.auth).json()
+            ids += [address["id"] for address in body["items"]]
+            cursor = body["next_cursor"]
+        self.assertEqual(ids, [address.pk for address in reversed(self.addresses)])
+
+    def test_invalid_cursor_is_rejected(self):
+        cursor = KeysetPagination.encode_cursor(["x"])
+        self.assertEqual(self.client.get(f"/api/v1/addresses?cursor={cursor}", **self.auth).status_code, 400)